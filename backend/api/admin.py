@@ -1,28 +1,39 @@
+from collections import Counter
+
 from django.contrib import admin
-from .models import CropRecommendation,PredictionHistory, PlantDiseaseDetection
+from .models import CropRecommendation, PlantDiseaseDetection
+from .pagination import EstimatedCountPaginator
+
+# Changelists here are built for tables with millions of rows: the user is
+# joined rather than fetched per row, no unbounded COUNT(*) is run, filters
+# only touch indexed columns, and searches match prefixes. There is no
+# date_hierarchy, because its year/month links need a pass over every row;
+# the created_at filter narrows by date without one.
+
 
 @admin.register(CropRecommendation)
 class CropRecommendationAdmin(admin.ModelAdmin):
     list_display = ('user', 'predicted_crop', 'recommended_fertilizer', 'created_at')
+    list_filter = ('predicted_crop', 'created_at')
+    list_select_related = ('user',)
+    # Case-insensitive prefix matches (istartswith): no leading wildcard, but
+    # words inside a value are not found
+    search_fields = ('^predicted_crop', '^recommended_fertilizer', '^user__username')
+    search_help_text = (
+        "Matches the start of the crop, fertilizer or username, ignoring case: "
+        "\"ric\" finds Rice, \"urea\" finds \"Urea + DAP\" but \"dap\" does not."
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at',)
 
-@admin.register(PredictionHistory)
-class PredictionHistoryAdmin(admin.ModelAdmin):
-    list_display = ('user', 'crop', 'fertilizer', 'prediction_date')
-    list_filter = ('crop', 'fertilizer', 'prediction_date')
-    search_fields = ('user__username', 'crop', 'fertilizer')
-    date_hierarchy = 'prediction_date'
-    readonly_fields = ('prediction_date',)
-    
-    def get_soil_params(self, obj):
-        return obj.soil_params
-    get_soil_params.short_description = 'Soil Parameters'
-    
     fieldsets = (
         (None, {
-            'fields': ('user', 'crop', 'fertilizer', 'prediction_date')
+            'fields': ('user', 'predicted_crop', 'recommended_fertilizer', 'created_at')
         }),
         ('Soil Parameters', {
-            'fields': ('soil_params_json',),
+            'fields': ('nitrogen', 'phosphorus', 'potassium', 'ph', 'rainfall', 'humidity', 'temperature'),
             'classes': ('collapse',)
         }),
     )
@@ -31,13 +42,25 @@ class PredictionHistoryAdmin(admin.ModelAdmin):
 @admin.register(PlantDiseaseDetection)
 class PlantDiseaseDetectionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'created_at', 'get_detected_classes')
-    list_filter = ('created_at', 'user')
-    search_fields = ('user__username',)
+    # A user filter would list every account in the sidebar; search by username instead
+    list_filter = ('created_at',)
+    list_select_related = ('user',)
+    search_fields = ('=user__username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('user',)
     readonly_fields = ('detected_classes', 'created_at')
-    
+
+    # Classes are stored once per box; show each class once with its box count
+    max_classes_shown = 3
+
     def get_detected_classes(self, obj):
-        if obj.detected_classes and isinstance(obj.detected_classes, list):
-            return ", ".join(str(item) for item in obj.detected_classes)
-        return "None"
-    
-    get_detected_classes.short_description = "Detected Diseases"
\ No newline at end of file
+        if not obj.detected_classes or not isinstance(obj.detected_classes, list):
+            return "None"
+        counts = Counter(obj.detected_classes)
+        shown = ", ".join(
+            f"{name} ×{n}" if n > 1 else str(name) for name, n in counts.most_common(self.max_classes_shown)
+        )
+        return shown + ", …" if len(counts) > self.max_classes_shown else shown
+
+    get_detected_classes.short_description = "Detected Diseases"
@@ -0,0 +1,251 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+
+from farm_help_project.metrics import register_gauges, span
+from pest_recognition import preprocessing
+from pest_recognition.backends import Detections, draw_detections
+from pest_recognition.inference import (
+    MAX_IMAGE_SIDE, class_names, decode_max_side, detect as detect_image, model_version
+)
+
+from . import rollups
+from .models import DetectionBox, PlantDiseaseDetection
+
+RESULT_TOKEN_SALT = 'api.plant-disease-result'
+
+IMAGE_FORMAT = getattr(settings, 'PLANT_DISEASE_IMAGE_FORMAT', 'webp')
+IMAGE_QUALITY = getattr(settings, 'PLANT_DISEASE_IMAGE_QUALITY', 80)
+THUMBNAIL_SIDE = getattr(settings, 'PLANT_DISEASE_THUMBNAIL_SIDE', 320)
+
+# Striped by image so renders of different images do not wait on each other
+_render_locks = [threading.Lock() for _ in range(32)]
+
+
+class DedupStats:
+    """Process-local hit/miss counters for the content-hash result cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+
+dedup_stats = DedupStats()
+register_gauges('detection_dedup', dedup_stats.as_dict)
+
+
+def decode_image(data):
+    """Decode encoded image bytes into a BGR array without touching disk,
+    at no more than the resolution inference will use."""
+    return preprocessing.decode(data, max_side=decode_max_side())
+
+
+def read_upload(upload):
+    """Return the bytes of an uploaded file, rewound so it can still be saved."""
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    return data
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def find_cached(image_hash, version):
+    """Latest finished detection of the same bytes by the same model, if any."""
+    # model_version is only filled in once inference has completed
+    return (
+        PlantDiseaseDetection.objects
+        .filter(image_hash=image_hash, model_version=version)
+        .order_by('-id')
+        .first()
+    )
+
+
+def reuse_cached(cached, user):
+    """Record a detection for ``user`` that shares ``cached``'s stored files and boxes."""
+    with transaction.atomic():
+        plant_detection = PlantDiseaseDetection.objects.create(
+            user=user,
+            image=cached.image.name,
+            result_image=cached.result_image.name or None,
+            thumbnail=cached.thumbnail.name or None,
+            detected_classes=cached.detected_classes,
+            image_hash=cached.image_hash,
+            model_version=cached.model_version,
+        )
+        DetectionBox.objects.bulk_create([
+            DetectionBox(
+                detection=plant_detection, class_name=box.class_name, confidence=box.confidence,
+                x1=box.x1, y1=box.y1, x2=box.x2, y2=box.y2
+            )
+            for box in cached.boxes.all()
+        ])
+        rollups.record_detections([plant_detection])
+    return plant_detection
+
+
+def detect(img):
+    """Return the detected class names and unsaved ``DetectionBox`` rows for ``img``."""
+    detections, classes = detect_image(img)
+    return to_boxes(img, detections, classes)
+
+
+def to_boxes(img, detections, classes):
+    """Class names and unsaved ``DetectionBox`` rows for ``detections`` found in ``img``."""
+    height, width = img.shape[:2]
+    boxes = []
+    for (x1, y1, x2, y2), score, class_id in zip(detections.boxes, detections.scores, detections.class_ids):
+        boxes.append(DetectionBox(
+            class_name=classes[int(class_id)],
+            confidence=float(score),
+            x1=float(x1) / width, y1=float(y1) / height,
+            x2=float(x2) / width, y2=float(y2) / height,
+        ))
+    return [box.class_name for box in boxes], boxes
+
+
+def thumbnail_file(img):
+    """List-view thumbnail of a decoded image, ready to assign to ``thumbnail``."""
+    with span('thumbnail'):
+        small, _ = preprocessing.downscale(img, THUMBNAIL_SIDE)
+        data, extension = preprocessing.encode(small, IMAGE_FORMAT, IMAGE_QUALITY)
+    # The storage names it by content; only the extension is kept
+    return ContentFile(data, name=f"thumbnail{extension}")
+
+
+def save_boxes(plant_detection, boxes):
+    """Replace the stored boxes of ``plant_detection``."""
+    plant_detection.boxes.all().delete()
+    for box in boxes:
+        box.detection = plant_detection
+    DetectionBox.objects.bulk_create(boxes)
+
+
+def run_detection(plant_detection, img=None, on_saved=None):
+    """Run disease inference for a saved detection and store its boxes.
+
+    ``img`` is the already-decoded upload when the caller has it; otherwise
+    the stored image is read back through the storage backend. Inference and
+    file writes happen before the transaction that stores the result, so no
+    database lock is held while the model runs. ``on_saved`` is called inside
+    that transaction; if it raises, the result is rolled back. The annotated
+    image is not rendered here; see ``ensure_result_image``.
+    """
+    if img is None:
+        with plant_detection.image.open('rb') as f:
+            img = decode_image(f.read())
+
+    version = model_version()
+    # Detections only enter the rollups with their first result
+    first_result = not plant_detection.model_version
+    detected_class_names, boxes = detect(img)
+    if not plant_detection.thumbnail:
+        thumbnail = thumbnail_file(img)
+        plant_detection.thumbnail.save(thumbnail.name, thumbnail, save=False)
+    with transaction.atomic():
+        plant_detection.detected_classes = detected_class_names
+        plant_detection.model_version = version
+        plant_detection.save()
+        save_boxes(plant_detection, boxes)
+        if first_result:
+            rollups.record_detections([plant_detection])
+        if on_saved is not None:
+            on_saved()
+    return plant_detection
+
+
+def render_result(plant_detection):
+    """The stored image with its boxes drawn, at most MAX_IMAGE_SIDE wide, as a
+    PLANT_DISEASE_IMAGE_FORMAT file."""
+    with span('decode'):
+        with plant_detection.image.open('rb') as f:
+            img = preprocessing.decode(f.read(), max_side=MAX_IMAGE_SIDE)
+        img, _ = preprocessing.downscale(img, MAX_IMAGE_SIDE)
+    height, width = img.shape[:2]
+
+    boxes = list(plant_detection.boxes.all())
+    # The model's own ids, so a disease has the same colour in every image
+    class_ids = {name: int(class_id) for class_id, name in class_names().items()}
+    for name in sorted({box.class_name for box in boxes} - class_ids.keys()):
+        # Stored by weights that had a class the current ones lack
+        class_ids[name] = max(class_ids.values(), default=-1) + 1
+    detections = Detections(
+        [(box.x1 * width, box.y1 * height, box.x2 * width, box.y2 * height) for box in boxes],
+        [box.confidence for box in boxes],
+        [class_ids[box.class_name] for box in boxes],
+    )
+    with span('render'):
+        annotated = draw_detections(img, detections, {class_id: name for name, class_id in class_ids.items()})
+    with span('encode'):
+        data, extension = preprocessing.encode(annotated, IMAGE_FORMAT, IMAGE_QUALITY)
+    return ContentFile(data, name=f"result{extension}")
+
+
+def ensure_result_image(plant_detection):
+    """Render and store the annotated image on first use; later calls are free.
+
+    Concurrent first requests in a process render once; across processes the
+    first conditional update wins and the others adopt its file.
+    """
+    if plant_detection.result_image:
+        return plant_detection
+    with _render_locks[hash(plant_detection.image_hash or plant_detection.pk) % len(_render_locks)]:
+        # Another upload of the same bytes, or a concurrent request, may already have rendered it
+        rendered = (
+            PlantDiseaseDetection.objects
+            .filter(Q(pk=plant_detection.pk) | Q(
+                image_hash=plant_detection.image_hash, model_version=plant_detection.model_version
+            ) & ~Q(image_hash=''))
+            .exclude(result_image='')
+            .exclude(result_image__isnull=True)
+            .values_list('result_image', flat=True)
+            .first()
+        )
+        if rendered:
+            plant_detection.result_image.name = rendered
+        else:
+            result = render_result(plant_detection)
+            with span('save'):
+                plant_detection.result_image.save(result.name, result, save=False)
+        claimed = (
+            PlantDiseaseDetection.objects
+            .filter(Q(result_image='') | Q(result_image__isnull=True), pk=plant_detection.pk)
+            .update(result_image=plant_detection.result_image.name)
+        )
+        if not claimed:
+            plant_detection.result_image.name = (
+                PlantDiseaseDetection.objects.values_list('result_image', flat=True).get(pk=plant_detection.pk)
+            )
+    return plant_detection
+
+
+def result_token(plant_detection):
+    """Unguessable token for the detection's annotated image URL."""
+    return signing.dumps(plant_detection.pk, salt=RESULT_TOKEN_SALT)
+
+
+def detection_for_token(token):
+    """The detection a ``result_token`` was issued for; raises BadSignature."""
+    return PlantDiseaseDetection.objects.get(pk=signing.loads(token, salt=RESULT_TOKEN_SALT))
@@ -0,0 +1,124 @@
+"""
+Streaming CSV / NDJSON exports of a user's predictions and disease detections.
+
+Rows are read with ``values_list().iterator(chunk_size=...)``, so no model
+instances are built and only one chunk is held in memory. Each chunk is
+written out as one block of text, optionally gzip-compressed with a sync
+flush so every block reaches the client as soon as it is produced.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import CropRecommendation, PlantDiseaseDetection
+
+CHUNK_SIZE = getattr(settings, 'HISTORY_EXPORT_CHUNK_SIZE', 2000)
+
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def _timestamp(value):
+    # Same representation as the JSON API (DRF's DateTimeField)
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+class Export:
+    """Columns of one export and how to turn a ``values_list`` row into output."""
+    header = ()
+    fields = ()
+
+    def __init__(self, queryset, request):
+        self.queryset = queryset
+        self.request = request
+
+    def csv_row(self, row):
+        raise NotImplementedError
+
+    def json_row(self, row):
+        raise NotImplementedError
+
+    def blocks(self, file_format):
+        """Yield text blocks: the CSV header first, then one block per chunk."""
+        rows = self.queryset.values_list(*self.fields).iterator(chunk_size=CHUNK_SIZE)
+        buffer = io.StringIO()
+        if file_format == 'csv':
+            writer = csv.writer(buffer)
+            writer.writerow(self.header)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            write = lambda row: writer.writerow(self.csv_row(row))
+        else:
+            write = lambda row: buffer.write(json.dumps(self.json_row(row)) + '\n')
+
+        pending = 0
+        for row in rows:
+            write(row)
+            pending += 1
+            if pending == CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            yield buffer.getvalue()
+
+
+class PredictionExport(Export):
+    soil_keys = tuple(CropRecommendation.SOIL_PARAMS)
+    header = ('id', 'prediction_date', 'crop', 'fertilizer') + soil_keys
+    fields = ('id', 'created_at', 'predicted_crop', 'recommended_fertilizer',
+              *CropRecommendation.SOIL_PARAMS.values())
+
+    def csv_row(self, row):
+        return (row[0], _timestamp(row[1]), *row[2:])
+
+    def json_row(self, row):
+        # The shape of /api/prediction-history/ results
+        return {
+            'id': row[0],
+            'prediction_date': _timestamp(row[1]),
+            'crop': row[2],
+            'fertilizer': row[3],
+            'soil_params': dict(zip(self.soil_keys, row[4:])),
+        }
+
+
+class DetectionExport(Export):
+    header = ('id', 'created_at', 'image', 'detected_classes', 'model_version')
+    fields = ('id', 'created_at', 'image', 'detected_classes', 'model_version')
+
+    def __init__(self, queryset, request):
+        super().__init__(queryset, request)
+        self.storage = PlantDiseaseDetection._meta.get_field('image').storage
+
+    def image_url(self, name):
+        return self.request.build_absolute_uri(self.storage.url(name)) if name else ''
+
+    def csv_row(self, row):
+        return (row[0], _timestamp(row[1]), self.image_url(row[2]), ';'.join(row[3]), row[4])
+
+    def json_row(self, row):
+        return {
+            'id': row[0],
+            'created_at': _timestamp(row[1]),
+            'image': self.image_url(row[2]),
+            'detected_classes': row[3],
+            'model_version': row[4],
+        }
+
+
+def encode(blocks, compress=False):
+    """UTF-8 encode text blocks, gzip-compressing them when asked."""
+    if not compress:
+        for block in blocks:
+            yield block.encode()
+        return
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for block in blocks:
+        yield compressor.compress(block.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
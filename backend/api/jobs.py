@@ -0,0 +1,122 @@
+"""
+Database-backed work queue for asynchronous plant disease detection.
+
+Workers claim jobs with a conditional UPDATE, so two workers can never hold
+the same job at once. A claim is a lease: if a worker dies mid-job, the lease
+expires and another worker picks the job up again. Results are committed only
+while the lease is still held, so a worker that lost its lease cannot
+overwrite the result of the worker that replaced it.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .detection import run_detection
+from .models import DetectionJob
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = getattr(settings, 'PLANT_DISEASE_JOB_LEASE_SECONDS', 300)
+MAX_ATTEMPTS = getattr(settings, 'PLANT_DISEASE_JOB_MAX_ATTEMPTS', 3)
+
+
+class LeaseLost(Exception):
+    """The worker's claim on a job expired and was taken over."""
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue(detection):
+    return DetectionJob.objects.create(detection=detection)
+
+
+def claim(worker, lease_seconds=LEASE_SECONDS):
+    """Claim the oldest runnable job for ``worker`` or return None."""
+    now = timezone.now()
+    runnable = DetectionJob.objects.filter(
+        Q(status=DetectionJob.PENDING)
+        | Q(status=DetectionJob.RUNNING, lease_expires_at__lt=now)
+    ).order_by('created_at')
+
+    for job in runnable.only('id', 'status', 'claimed_by', 'attempts', 'error')[:10]:
+        if job.attempts >= MAX_ATTEMPTS:
+            DetectionJob.objects.filter(pk=job.pk, claimed_by=job.claimed_by, status=job.status).update(
+                status=DetectionJob.FAILED,
+                error=job.error or 'Exceeded maximum attempts',
+                finished_at=now,
+            )
+            continue
+        # Compare-and-swap on the previous owner: only one worker can win
+        claimed = DetectionJob.objects.filter(
+            pk=job.pk, status=job.status, claimed_by=job.claimed_by
+        ).update(
+            status=DetectionJob.RUNNING,
+            claimed_by=worker,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return DetectionJob.objects.select_related('detection').get(pk=job.pk)
+    return None
+
+
+def _owned(job, worker):
+    return DetectionJob.objects.filter(
+        pk=job.pk, status=DetectionJob.RUNNING, claimed_by=worker
+    )
+
+
+def complete(job, worker):
+    if not _owned(job, worker).update(status=DetectionJob.DONE, finished_at=timezone.now(), error=''):
+        raise LeaseLost(f"Lost lease on job {job.pk}")
+
+
+def fail(job, worker, error):
+    """Record ``error``; the job is retried until it runs out of attempts."""
+    retry = job.attempts < MAX_ATTEMPTS
+    _owned(job, worker).update(
+        status=DetectionJob.PENDING if retry else DetectionJob.FAILED,
+        claimed_by='',
+        lease_expires_at=None,
+        error=error,
+        finished_at=None if retry else timezone.now(),
+    )
+
+
+def process(job, worker):
+    try:
+        # Inference runs outside any transaction; only the result and the
+        # job's completion are written together
+        run_detection(job.detection, on_saved=lambda: complete(job, worker))
+    except LeaseLost:
+        logger.warning("Job %s was taken over by another worker", job.pk)
+    except Exception as exc:
+        logger.exception("Detection job %s failed", job.pk)
+        fail(job, worker, f"{type(exc).__name__}: {exc}")
+
+
+def run_worker(poll_interval=1.0, max_jobs=None, should_stop=lambda: False):
+    """Claim and process jobs until ``should_stop()`` or ``max_jobs`` reached."""
+    worker = worker_name()
+    processed = 0
+    logger.info("Detection worker %s started", worker)
+    while not should_stop():
+        if max_jobs is not None and processed >= max_jobs:
+            break
+        job = claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        process(job, worker)
+        processed += 1
+    logger.info("Detection worker %s stopped after %d jobs", worker, processed)
+    return processed
@@ -0,0 +1,100 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.models import PlantDiseaseDetection
+from api.storage import is_content_addressed
+
+FILE_FIELDS = ('image', 'result_image', 'thumbnail')
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete detection media files that no PlantDiseaseDetection references. With "
+        "--consolidate, first move files stored under upload names to content-addressed "
+        "names, so duplicate copies become unreferenced and are deleted too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consolidate', action='store_true',
+                            help="Re-store legacy files by content hash and point rows at them.")
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help="Keep files younger than this; uploads are stored before their row is saved.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without changing it.")
+
+    def handle(self, *args, **options):
+        if options['consolidate']:
+            for field_name in FILE_FIELDS:
+                self._consolidate(field_name, options['dry_run'])
+
+        referenced = set()
+        for names in PlantDiseaseDetection.objects.values_list(*FILE_FIELDS).iterator(chunk_size=2000):
+            referenced.update(name for name in names if name)
+
+        cutoff = time.time() - options['min_age_hours'] * 3600
+        deleted = freed = 0
+        for field_name in FILE_FIELDS:
+            field = PlantDiseaseDetection._meta.get_field(field_name)
+            for name in self._walk(field.storage, field.upload_to.rstrip('/')):
+                if name in referenced or field.storage.get_modified_time(name).timestamp() > cutoff:
+                    continue
+                size = field.storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(f"Would delete {name}")
+                else:
+                    # A detection saved since `referenced` was built may share these bytes
+                    if self._is_referenced(name) or field.storage.get_modified_time(name).timestamp() > cutoff:
+                        continue
+                    field.storage.delete(name)
+                deleted += 1
+                freed += size
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} orphaned files ({freed / 1024 / 1024:.1f} MB)"))
+
+    def _is_referenced(self, name):
+        query = Q()
+        for field_name in FILE_FIELDS:
+            query |= Q(**{field_name: name})
+        return PlantDiseaseDetection.objects.filter(query).exists()
+
+    def _walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        subdirectories, files = storage.listdir(directory)
+        for filename in files:
+            yield f"{directory}/{filename}"
+        for subdirectory in subdirectories:
+            yield from self._walk(storage, f"{directory}/{subdirectory}")
+
+    def _consolidate(self, field_name, dry_run):
+        storage = PlantDiseaseDetection._meta.get_field(field_name).storage
+        rows = (
+            PlantDiseaseDetection.objects
+            .exclude(**{field_name: ''})
+            .exclude(**{f'{field_name}__isnull': True})
+            .values_list('pk', field_name)
+        )
+        renamed = {}
+        moved = 0
+        for pk, name in rows.iterator(chunk_size=2000):
+            if is_content_addressed(name):
+                continue
+            if name not in renamed:
+                if not storage.exists(name):
+                    self.stderr.write(f"Missing file {name} (detection {pk})")
+                    renamed[name] = None
+                    continue
+                if dry_run:
+                    renamed[name] = name
+                else:
+                    with storage.open(name) as f:
+                        renamed[name] = storage.save(name, f)
+            if renamed[name] is None:
+                continue
+            if not dry_run:
+                PlantDiseaseDetection.objects.filter(pk=pk).update(**{field_name: renamed[name]})
+            moved += 1
+        verb = "Would move" if dry_run else "Moved"
+        self.stdout.write(f"{verb} {moved} {field_name} references to content-addressed files")
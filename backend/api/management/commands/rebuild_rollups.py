@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the weekly crop and disease rollups per region from all predictions and "
+        "detections. Run once after deploying them, and after bulk imports or any deletion "
+        "of predictions, detections or users, which the rollups do not count back out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Source rows fetched per query.")
+
+    def handle(self, *args, **options):
+        crop_buckets, disease_buckets = rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {crop_buckets} crop and {disease_buckets} disease rollup rows"
+        ))
@@ -0,0 +1,59 @@
+import multiprocessing
+import signal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(poll_interval, max_jobs):
+    django.setup()
+    from api.jobs import run_worker
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+    run_worker(poll_interval=poll_interval, max_jobs=max_jobs, should_stop=lambda: bool(stopping))
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that process queued plant disease detections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help="Number of worker processes.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help="Exit each worker after this many jobs (default: run forever).")
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        # Children must open their own database connections
+        connections.close_all()
+
+        workers = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(options['poll_interval'], options['max_jobs']),
+                name=f"detection-worker-{i}",
+            )
+            for i in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} detection worker(s)")
+
+        def _stop(*args):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, _stop)
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Workers received the same SIGINT and finish their current job
+            for worker in workers:
+                worker.join()
+        self.stdout.write("Detection workers stopped")
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_detectionjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plantdiseasedetection",
+            name="image_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="plantdiseasedetection",
+            name="model_version",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="plantdiseasedetection",
+            index=models.Index(
+                fields=["image_hash", "model_version"],
+                name="api_plantdi_image_h_06b2a3_idx",
+            ),
+        ),
+    ]
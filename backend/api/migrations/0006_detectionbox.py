@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_plantdiseasedetection_image_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DetectionBox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("class_name", models.CharField(max_length=100)),
+                ("confidence", models.FloatField()),
+                ("x1", models.FloatField()),
+                ("y1", models.FloatField()),
+                ("x2", models.FloatField()),
+                ("y2", models.FloatField()),
+                (
+                    "detection",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="boxes",
+                        to="api.plantdiseasedetection",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["detection", "-confidence"],
+                "indexes": [
+                    models.Index(
+                        fields=["class_name", "confidence"],
+                        name="api_detecti_class_n_96a4d4_idx",
+                    )
+                ],
+            },
+        ),
+    ]
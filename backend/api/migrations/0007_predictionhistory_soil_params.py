@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:27
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_soil_params(apps, schema_editor):
+    PredictionHistory = apps.get_model("api", "PredictionHistory")
+    batch = []
+    for history in PredictionHistory.objects.only("id", "soil_params_json").iterator(
+        chunk_size=2000
+    ):
+        try:
+            history.soil_params = json.loads(history.soil_params_json or "{}")
+        except ValueError:
+            history.soil_params = {}
+        batch.append(history)
+        if len(batch) >= 2000:
+            PredictionHistory.objects.bulk_update(batch, ["soil_params"])
+            batch = []
+    PredictionHistory.objects.bulk_update(batch, ["soil_params"])
+
+
+def copy_soil_params_json(apps, schema_editor):
+    PredictionHistory = apps.get_model("api", "PredictionHistory")
+    batch = []
+    for history in PredictionHistory.objects.only("id", "soil_params").iterator(
+        chunk_size=2000
+    ):
+        history.soil_params_json = json.dumps(history.soil_params)
+        batch.append(history)
+        if len(batch) >= 2000:
+            PredictionHistory.objects.bulk_update(batch, ["soil_params_json"])
+            batch = []
+    PredictionHistory.objects.bulk_update(batch, ["soil_params_json"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_detectionbox"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="predictionhistory",
+            name="soil_params",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(copy_soil_params, copy_soil_params_json),
+        # Lets the column be re-added when migrating backwards
+        migrations.AlterField(
+            model_name="predictionhistory",
+            name="soil_params_json",
+            field=models.TextField(default="{}"),
+        ),
+        migrations.RemoveField(
+            model_name="predictionhistory",
+            name="soil_params_json",
+        ),
+        migrations.AddIndex(
+            model_name="predictionhistory",
+            index=models.Index(
+                fields=["user", "prediction_date"],
+                name="api_predict_user_id_03f992_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:28
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+SOIL_PARAMS = {
+    "n": "nitrogen",
+    "p": "phosphorus",
+    "k": "potassium",
+    "ph": "ph",
+    "rainfall": "rainfall",
+    "humidity": "humidity",
+    "temperature": "temperature",
+}
+
+# The old view wrote the history row and the recommendation a few
+# milliseconds apart; anything within this window is the same prediction
+SAME_PREDICTION = timedelta(seconds=5)
+
+
+def merge_history(apps, schema_editor):
+    """Fold PredictionHistory rows into CropRecommendation, creating a
+    recommendation only for history rows that have no twin."""
+    CropRecommendation = apps.get_model("api", "CropRecommendation")
+    PredictionHistory = apps.get_model("api", "PredictionHistory")
+
+    unmatched = {}
+    for rec in CropRecommendation.objects.only(
+        "id", "user_id", "predicted_crop", "created_at"
+    ):
+        unmatched.setdefault((rec.user_id, rec.predicted_crop), []).append(
+            rec.created_at
+        )
+
+    for history in PredictionHistory.objects.order_by("id").iterator(chunk_size=2000):
+        candidates = unmatched.get((history.user_id, history.crop), [])
+        twin = next(
+            (
+                created_at
+                for created_at in candidates
+                if abs(created_at - history.prediction_date) <= SAME_PREDICTION
+            ),
+            None,
+        )
+        if twin is not None:
+            candidates.remove(twin)
+            continue
+        params = history.soil_params or {}
+        rec = CropRecommendation.objects.create(
+            user_id=history.user_id,
+            predicted_crop=history.crop,
+            recommended_fertilizer=history.fertilizer,
+            **{
+                field: float(params.get(key) or 0) for key, field in SOIL_PARAMS.items()
+            },
+        )
+        # created_at is auto_now_add; keep the original timestamp
+        CropRecommendation.objects.filter(pk=rec.pk).update(
+            created_at=history.prediction_date
+        )
+
+
+def split_history(apps, schema_editor):
+    CropRecommendation = apps.get_model("api", "CropRecommendation")
+    PredictionHistory = apps.get_model("api", "PredictionHistory")
+
+    for rec in CropRecommendation.objects.order_by("id").iterator(chunk_size=2000):
+        history = PredictionHistory.objects.create(
+            user_id=rec.user_id,
+            crop=rec.predicted_crop,
+            fertilizer=rec.recommended_fertilizer[:100],
+            soil_params={
+                key: getattr(rec, field) for key, field in SOIL_PARAMS.items()
+            },
+        )
+        PredictionHistory.objects.filter(pk=history.pk).update(
+            prediction_date=rec.created_at
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_predictionhistory_soil_params"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="croprecommendation",
+            index=models.Index(
+                fields=["user", "created_at"], name="api_croprec_user_id_6d372d_idx"
+            ),
+        ),
+        migrations.RunPython(merge_history, split_history),
+        migrations.DeleteModel(
+            name="PredictionHistory",
+        ),
+    ]
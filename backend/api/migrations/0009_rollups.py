@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_merge_prediction_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CropRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("region", models.CharField(blank=True, default="", max_length=255)),
+                ("week", models.DateField()),
+                ("crop", models.CharField(max_length=100)),
+                ("predictions", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["week", "region"], name="api_croprol_week_cc03bb_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("region", "week", "crop"), name="unique_crop_rollup"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DiseaseRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("region", models.CharField(blank=True, default="", max_length=255)),
+                ("week", models.DateField()),
+                ("class_name", models.CharField(max_length=100)),
+                ("detections", models.PositiveIntegerField(default=0)),
+                ("boxes", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["week", "region"], name="api_disease_week_89d2c1_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("region", "week", "class_name"),
+                        name="unique_disease_rollup",
+                    )
+                ],
+            },
+        ),
+    ]
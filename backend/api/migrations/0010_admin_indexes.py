@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="croprecommendation",
+            index=models.Index(
+                fields=["predicted_crop", "id"], name="api_croprec_predict_494a20_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="croprecommendation",
+            index=models.Index(
+                fields=["created_at"], name="api_croprec_created_50abf9_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="plantdiseasedetection",
+            index=models.Index(
+                fields=["created_at"], name="api_plantdi_created_80cd67_idx"
+            ),
+        ),
+    ]
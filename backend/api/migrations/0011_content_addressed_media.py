@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:47
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plantdiseasedetection",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                max_length=255,
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to="plant_disease_thumbnails/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="plantdiseasedetection",
+            name="image",
+            field=models.ImageField(
+                max_length=255,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to="plant_disease_images/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="plantdiseasedetection",
+            name="result_image",
+            field=models.ImageField(
+                blank=True,
+                max_length=255,
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to="plant_disease_results/",
+            ),
+        ),
+    ]
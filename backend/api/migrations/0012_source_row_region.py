@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Trim
+
+
+def copy_farm_location(apps, schema_editor):
+    # Rows saved before this migration only have the user's current location
+    User = apps.get_model("users", "User")
+    location = Subquery(User.objects.filter(pk=OuterRef("user_id")).values("farm_location")[:1])
+    for model_name in ("CropRecommendation", "PlantDiseaseDetection"):
+        apps.get_model("api", model_name).objects.update(region=Trim(Coalesce(location, Value(""))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_content_addressed_media"),
+        ("users", "0003_user_is_premium_user_phone"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="croprecommendation",
+            name="region",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="plantdiseasedetection",
+            name="region",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RunPython(copy_farm_location, migrations.RunPython.noop),
+    ]
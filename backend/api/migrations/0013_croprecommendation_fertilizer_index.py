@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_source_row_region"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="croprecommendation",
+            index=models.Index(
+                fields=["recommended_fertilizer"], name="api_croprec_recomme_55f160_idx"
+            ),
+        ),
+    ]
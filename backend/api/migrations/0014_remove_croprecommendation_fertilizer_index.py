@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_croprecommendation_fertilizer_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="croprecommendation",
+            name="api_croprec_recomme_55f160_idx",
+        ),
+    ]
@@ -1,8 +1,17 @@
 from django.db import models
 from users.models import User
-import json
+
+from .storage import content_storage
+
+
+def region_of(user):
+    """Rollup region for rows saved by ``user`` (bulk_create callers set it themselves)."""
+    return (user.farm_location or '').strip()
+
+
 # Create your models here.
 class CropRecommendation(models.Model):
+    """One crop prediction; also serves the prediction history API."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='crop_recommendations')
     nitrogen = models.FloatField()
     phosphorus = models.FloatField()
@@ -14,33 +23,42 @@ class CropRecommendation(models.Model):
     predicted_crop = models.CharField(max_length=100)
     recommended_fertilizer = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # The user's farm_location when the prediction was made, for the rollups
+    region = models.CharField(max_length=255, blank=True, default='')
 
-    def __str__(self):
-        return f"{self.user.username} - {self.predicted_crop}"
-    
+    # Keys the prediction history API has always used for the soil inputs
+    SOIL_PARAMS = {
+        'n': 'nitrogen',
+        'p': 'phosphorus',
+        'k': 'potassium',
+        'ph': 'ph',
+        'rainfall': 'rainfall',
+        'humidity': 'humidity',
+        'temperature': 'temperature',
+    }
 
-    
+    class Meta:
+        indexes = [
+            # Serves the per-user, newest-first history pagination
+            models.Index(fields=['user', 'created_at']),
+            # Admin: the crop filter in primary-key order, and the distinct
+            # crops listed in its sidebar
+            models.Index(fields=['predicted_crop', 'id']),
+            models.Index(fields=['created_at']),
+        ]
 
-class PredictionHistory(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    prediction_date = models.DateTimeField(auto_now_add=True)
-    crop = models.CharField(max_length=100)
-    fertilizer = models.CharField(max_length=100)
-    soil_params_json = models.TextField()  # Store as JSON string
-    
     def save(self, *args, **kwargs):
-        # Ensure soil_params_json is a valid JSON string
-        if isinstance(self.soil_params_json, dict):
-            self.soil_params_json = json.dumps(self.soil_params_json)
+        if self._state.adding and not self.region:
+            self.region = region_of(self.user)
         super().save(*args, **kwargs)
-    
+
     @property
     def soil_params(self):
-        return json.loads(self.soil_params_json)
-    
+        return {key: getattr(self, field) for key, field in self.SOIL_PARAMS.items()}
+
     def __str__(self):
-        return f"{self.user.username} - {self.crop} - {self.prediction_date}"
-    
+        return f"{self.user.username} - {self.predicted_crop}"
+
 
 
 # api/models.py
@@ -49,10 +67,131 @@ class PredictionHistory(models.Model):
 
 class PlantDiseaseDetection(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='plant_disease_images/')
+    # Stored by content hash and shared between detections of the same bytes
+    image = models.ImageField(upload_to='plant_disease_images/', storage=content_storage, max_length=255)
     detected_classes = models.JSONField(default=list)
-    result_image = models.ImageField(upload_to='plant_disease_results/', null=True, blank=True)
+    result_image = models.ImageField(
+        upload_to='plant_disease_results/', storage=content_storage, max_length=255, null=True, blank=True
+    )
+    # Small WebP/JPEG for list views, written when the detection is saved
+    thumbnail = models.ImageField(
+        upload_to='plant_disease_thumbnails/', storage=content_storage, max_length=255, null=True, blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    # SHA-256 of the uploaded bytes and the weights that produced the result,
+    # used to reuse results for repeated uploads
+    image_hash = models.CharField(max_length=64, blank=True, default='')
+    model_version = models.CharField(max_length=64, blank=True, default='')
+    # The user's farm_location when the detection was made, for the rollups
+    region = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['image_hash', 'model_version']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.region:
+            self.region = region_of(self.user)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Detection {self.id} by {self.user.username} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class DetectionBox(models.Model):
+    """One box found in a PlantDiseaseDetection.
+
+    Coordinates are fractions of the image width and height, so they hold
+    whatever resolution the image was decoded or rendered at.
+    """
+    detection = models.ForeignKey(PlantDiseaseDetection, on_delete=models.CASCADE, related_name='boxes')
+    class_name = models.CharField(max_length=100)
+    confidence = models.FloatField()
+    x1 = models.FloatField()
+    y1 = models.FloatField()
+    x2 = models.FloatField()
+    y2 = models.FloatField()
+
+    class Meta:
+        ordering = ['detection', '-confidence']
+        indexes = [
+            models.Index(fields=['class_name', 'confidence']),
+        ]
+
+    def __str__(self):
+        return f"{self.class_name} {self.confidence:.2f} in detection {self.detection_id}"
+
+
+class DetectionJob(models.Model):
+    """Work-queue entry for a PlantDiseaseDetection processed off the request thread."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    detection = models.OneToOneField(PlantDiseaseDetection, on_delete=models.CASCADE, related_name='job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Lease held by the worker currently processing the job
+    claimed_by = models.CharField(max_length=64, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} for detection {self.detection_id} ({self.status})"
+
+
+class CropRollup(models.Model):
+    """Predictions of one crop in one region and week, kept current by api.rollups."""
+    region = models.CharField(max_length=255, blank=True, default='')
+    # Monday of the week, in TIME_ZONE
+    week = models.DateField()
+    crop = models.CharField(max_length=100)
+    predictions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'week', 'crop'], name='unique_crop_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['week', 'region']),
+        ]
+
+    def __str__(self):
+        return f"{self.crop} in {self.region or 'unknown region'}, week of {self.week}: {self.predictions}"
+
+
+class DiseaseRollup(models.Model):
+    """Detections of one disease class in one region and week, kept current by api.rollups."""
+    region = models.CharField(max_length=255, blank=True, default='')
+    week = models.DateField()
+    class_name = models.CharField(max_length=100)
+    # Images the class was found in, and boxes of it across those images
+    detections = models.PositiveIntegerField(default=0)
+    boxes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'week', 'class_name'], name='unique_disease_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['week', 'region']),
+        ]
+
+    def __str__(self):
+        return f"{self.class_name} in {self.region or 'unknown region'}, week of {self.week}: {self.detections}"
@@ -0,0 +1,136 @@
+"""
+Weekly per-region counts of predicted crops and detected diseases.
+
+Every write path adds its rows to CropRollup / DiseaseRollup as it saves
+them, with one multi-row ``INSERT ... ON CONFLICT DO UPDATE`` that increments
+the counters (SQLite 3.24+ and PostgreSQL). Dashboards then read a handful of
+rollup rows instead of scanning every prediction and parsing every
+detection's class list.
+
+The region is the ``region`` stored on each source row (the user's
+``farm_location`` when it was saved, so later moves do not relabel history),
+and the week is the Monday of ``created_at`` in TIME_ZONE. ``manage.py
+rebuild_rollups`` recomputes both tables from the source rows, e.g. after
+importing data or to repair drift.
+
+Deletes are not counted back out: after deleting predictions, detections or
+users, run ``rebuild_rollups``.
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CropRecommendation, CropRollup, DiseaseRollup, PlantDiseaseDetection, region_of
+
+
+def week_of(moment):
+    day = timezone.localdate(moment)
+    return day - timedelta(days=day.weekday())
+
+
+# Rows per statement, well inside SQLite's bound-parameter limit
+UPSERT_BATCH = 200
+
+
+def _increment(model, key_fields, counter_fields, counts):
+    """Add ``counts`` ({key tuple: tuple of increments}) to ``model``'s counters."""
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ', '.join(map(qn, [*key_fields, *counter_fields]))
+    row = f"({', '.join(['%s'] * (len(key_fields) + len(counter_fields)))})"
+    update = ', '.join(f"{qn(f)} = {table}.{qn(f)} + excluded.{qn(f)}" for f in counter_fields)
+    items = list(counts.items())
+    adapt = lambda value: connection.ops.adapt_datefield_value(value) if isinstance(value, date) else value
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), UPSERT_BATCH):
+            batch = items[start:start + UPSERT_BATCH]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(batch))} "
+                f"ON CONFLICT ({', '.join(map(qn, key_fields))}) DO UPDATE SET {update}",
+                [adapt(value) for key, increments in batch for value in (*key, *increments)],
+            )
+
+
+def record_predictions(recommendations):
+    """Count saved CropRecommendation rows (e.g. the result of bulk_create)."""
+    counts = Counter(
+        (r.region, week_of(r.created_at), r.predicted_crop) for r in recommendations
+    )
+    _increment(CropRollup, ['region', 'week', 'crop'], ['predictions'], {key: (n,) for key, n in counts.items()})
+
+
+def record_detections(detections):
+    """Count saved PlantDiseaseDetection rows with their final ``detected_classes``."""
+    counts = {}
+    for detection in detections:
+        region, week = detection.region, week_of(detection.created_at)
+        for class_name, boxes in Counter(detection.detected_classes).items():
+            images, total = counts.get((region, week, class_name), (0, 0))
+            counts[(region, week, class_name)] = (images + 1, total + boxes)
+    _increment(DiseaseRollup, ['region', 'week', 'class_name'], ['detections', 'boxes'], counts)
+
+
+def rebuild(chunk_size=2000):
+    """Recompute both rollup tables from every prediction and detection.
+
+    Source rows are read in chunks and counted in memory, so memory grows with
+    the number of buckets, not rows. Counting, deleting and inserting run in
+    one transaction, so a row saved meanwhile is either counted here or upserts
+    after the new rows are in. Returns (crop buckets, disease buckets).
+    """
+    with transaction.atomic():
+        crops = Counter()
+        predictions = CropRecommendation.objects.values_list('region', 'created_at', 'predicted_crop')
+        for region, created_at, crop in predictions.iterator(chunk_size=chunk_size):
+            crops[(region, week_of(created_at), crop)] += 1
+
+        diseases = {}
+        detections = PlantDiseaseDetection.objects.values_list('region', 'created_at', 'detected_classes')
+        for region, created_at, classes in detections.iterator(chunk_size=chunk_size):
+            for class_name, boxes in Counter(classes).items():
+                key = (region, week_of(created_at), class_name)
+                images, total = diseases.get(key, (0, 0))
+                diseases[key] = (images + 1, total + boxes)
+
+        CropRollup.objects.all().delete()
+        DiseaseRollup.objects.all().delete()
+        CropRollup.objects.bulk_create(
+            [CropRollup(region=region, week=week, crop=crop, predictions=n)
+             for (region, week, crop), n in crops.items()],
+            batch_size=1000,
+        )
+        DiseaseRollup.objects.bulk_create(
+            [DiseaseRollup(region=region, week=week, class_name=class_name, detections=images, boxes=boxes)
+             for (region, week, class_name), (images, boxes) in diseases.items()],
+            batch_size=1000,
+        )
+    return len(crops), len(diseases)
+
+
+def weekly_summary(weeks, region=None, top=5):
+    """Top crops and diseases per (region, week) over the last ``weeks`` weeks, newest first."""
+    since = week_of(timezone.now()) - timedelta(weeks=weeks - 1)
+    buckets = {}
+
+    def bucket(row):
+        key = (row.week, row.region)
+        if key not in buckets:
+            buckets[key] = {'region': row.region, 'week': row.week, 'crops': [], 'diseases': []}
+        return buckets[key]
+
+    crop_rows = CropRollup.objects.filter(week__gte=since)
+    disease_rows = DiseaseRollup.objects.filter(week__gte=since)
+    if region is not None:
+        crop_rows = crop_rows.filter(region=region)
+        disease_rows = disease_rows.filter(region=region)
+    for row in crop_rows.order_by('-predictions', 'crop'):
+        crops = bucket(row)['crops']
+        if len(crops) < top:
+            crops.append({'crop': row.crop, 'predictions': row.predictions})
+    for row in disease_rows.order_by('-detections', '-boxes', 'class_name'):
+        diseases = bucket(row)['diseases']
+        if len(diseases) < top:
+            diseases.append({'class_name': row.class_name, 'detections': row.detections, 'boxes': row.boxes})
+    return [buckets[key] for key in sorted(buckets, key=lambda key: (-key[0].toordinal(), key[1]))]
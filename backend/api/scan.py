@@ -0,0 +1,207 @@
+"""
+Field scans: many leaf photos, uploaded as files or one zip archive, processed
+as a pipeline of generators.
+
+    sources -> dedup / decode -> batched inference -> save -> results
+
+Only one inference batch of images is ever held in memory. Archive members
+are read one at a time from the spooled upload.
+"""
+import os
+import zipfile
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from farm_help_project.metrics import span
+from pest_recognition.inference import detect_batch, model_version
+
+from . import rollups
+from .detection import (
+    content_hash, decode_image, dedup_stats, find_cached, read_upload, reuse_cached, save_boxes, thumbnail_file,
+    to_boxes
+)
+from .models import PlantDiseaseDetection
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+MAX_IMAGES = getattr(settings, 'PLANT_DISEASE_SCAN_MAX_IMAGES', 500)
+MAX_IMAGE_BYTES = getattr(settings, 'PLANT_DISEASE_SCAN_MAX_IMAGE_BYTES', 20 * 1024 * 1024)
+BATCH_SIZE = getattr(settings, 'PLANT_DISEASE_BATCH_MAX_SIZE', 8)
+
+
+class ScanError(ValueError):
+    """The upload as a whole cannot be scanned."""
+
+
+def _is_image_name(name):
+    base = os.path.basename(name)
+    return (
+        not base.startswith('.')
+        and '__MACOSX/' not in name
+        and os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def archive_members(archive):
+    """Image entries of a zip upload; raises ScanError for bad or oversized archives."""
+    try:
+        members = [
+            info for info in zipfile.ZipFile(archive).infolist()
+            if not info.is_dir() and _is_image_name(info.filename)
+        ]
+    except zipfile.BadZipFile:
+        raise ScanError("Not a valid zip archive.")
+    if not members:
+        raise ScanError("The archive contains no images.")
+    if len(members) > MAX_IMAGES:
+        raise ScanError(f"At most {MAX_IMAGES} images can be scanned at once.")
+    return members
+
+
+def iter_archive(archive, members):
+    """Yield (name, bytes or None, error) per archive member, reading one at a time."""
+    archive.seek(0)
+    with zipfile.ZipFile(archive) as zf:
+        for info in members:
+            name = os.path.basename(info.filename)
+            # file_size comes from the archive itself; never read past the limit
+            if info.file_size > MAX_IMAGE_BYTES:
+                yield name, None, "Image is too large."
+                continue
+            with zf.open(info) as member:
+                data = member.read(MAX_IMAGE_BYTES + 1)
+            if len(data) > MAX_IMAGE_BYTES:
+                yield name, None, "Image is too large."
+                continue
+            yield name, data, None
+
+
+def iter_files(files):
+    """Yield (name, bytes or None, error) per uploaded file."""
+    for upload in files:
+        if upload.size > MAX_IMAGE_BYTES:
+            yield upload.name, None, "Image is too large."
+            continue
+        yield upload.name, read_upload(upload), None
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def scan(sources, user, batch_size=BATCH_SIZE):
+    """Yield (name, PlantDiseaseDetection or None, error, cached) for each source, in order.
+
+    Uploads already processed by the current model are reused as in the
+    single-image endpoint; the rest are decoded, run through the model one
+    batch at a time and saved one transaction per batch. Repeats of an image
+    within a batch reuse its result once it is saved.
+    """
+    version = model_version()
+    for batch in _batches(sources, batch_size):
+        results = []
+        to_infer = []
+        # image_hash -> result of the first copy in this batch, and the later copies
+        pending = {}
+        repeats = []
+        for name, data, error in batch:
+            if error is not None:
+                results.append([name, None, error, False])
+                continue
+            with span('hash'):
+                image_hash = content_hash(data)
+            if image_hash in pending:
+                dedup_stats.hit()
+                result = [name, None, None, True]
+                results.append(result)
+                repeats.append((result, pending[image_hash]))
+                continue
+            with span('dedup'):
+                cached = find_cached(image_hash, version)
+            if cached is not None:
+                dedup_stats.hit()
+                results.append([name, reuse_cached(cached, user), None, True])
+                continue
+            dedup_stats.miss()
+            try:
+                with span('decode'):
+                    img = decode_image(data)
+            except ValueError as exc:
+                results.append([name, None, str(exc), False])
+                continue
+            result = [name, None, None, False]
+            results.append(result)
+            pending[image_hash] = result
+            to_infer.append((result, data, image_hash, img))
+
+        if to_infer:
+            detections, classes = detect_batch([img for _, _, _, img in to_infer])
+            with span('save'), transaction.atomic():
+                saved = []
+                for (result, data, image_hash, img), found in zip(to_infer, detections):
+                    detected_class_names, boxes = to_boxes(img, found, classes)
+                    plant_detection = PlantDiseaseDetection(
+                        user=user,
+                        detected_classes=detected_class_names,
+                        image_hash=image_hash,
+                        model_version=version,
+                        thumbnail=thumbnail_file(img),
+                    )
+                    plant_detection.image.save(os.path.basename(result[0]), ContentFile(data), save=False)
+                    plant_detection.save()
+                    save_boxes(plant_detection, boxes)
+                    result[1] = plant_detection
+                    saved.append(plant_detection)
+                rollups.record_detections(saved)
+        for result, first in repeats:
+            result[1] = reuse_cached(first[1], user)
+
+        for name, plant_detection, error, from_cache in results:
+            yield name, plant_detection, error, from_cache
+
+
+class ScanSummary:
+    """Field-level totals accumulated while results stream out."""
+
+    def __init__(self):
+        self.images = 0
+        self.failed = 0
+        self.cached = 0
+        self.healthy = 0
+        self.images_with_class = Counter()
+        self.boxes_per_class = Counter()
+
+    def add(self, plant_detection, error, cached=False):
+        self.images += 1
+        if error is not None:
+            self.failed += 1
+            return
+        self.cached += cached
+        classes = plant_detection.detected_classes
+        if not classes:
+            self.healthy += 1
+        self.boxes_per_class.update(classes)
+        self.images_with_class.update(set(classes))
+
+    def as_dict(self):
+        scanned = self.images - self.failed
+        return {
+            'images': self.images,
+            'failed': self.failed,
+            'cached': self.cached,
+            'healthy_images': self.healthy,
+            'classes': {
+                name: {
+                    'images': self.images_with_class[name],
+                    'boxes': self.boxes_per_class[name],
+                    'share_of_images': self.images_with_class[name] / scanned if scanned else 0.0,
+                }
+                for name, _ in self.images_with_class.most_common()
+            },
+        }
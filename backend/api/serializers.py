@@ -1,7 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import CropRecommendation
-from .models import PredictionHistory
+from django.urls import reverse
 from .models import PlantDiseaseDetection
+from .models import DetectionBox
+from .models import DetectionJob
+from .detection import result_token
 
 class CropRecommendationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,24 +14,82 @@ class CropRecommendationSerializer(serializers.ModelSerializer):
         read_only_fields = ['predicted_crop', 'recommended_fertilizer', 'user']
 
 
+class SoilSampleSerializer(serializers.Serializer):
+    nitrogen = serializers.FloatField(default=0)
+    phosphorus = serializers.FloatField(default=0)
+    potassium = serializers.FloatField(default=0)
+    ph = serializers.FloatField(default=0)
+    rainfall = serializers.FloatField(default=0)
+    humidity = serializers.FloatField(default=0)
+    temperature = serializers.FloatField(default=0)
+
+
+class CropBatchPredictionSerializer(serializers.Serializer):
+    samples = SoilSampleSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.CROP_PREDICTION_MAX_BATCH_SIZE
+    )
+
+
 
 
 class PredictionHistorySerializer(serializers.ModelSerializer):
-    soil_params = serializers.SerializerMethodField()
-    
+    """History view of a CropRecommendation, in the shape the history API has always had."""
+    prediction_date = serializers.DateTimeField(source='created_at', read_only=True)
+    crop = serializers.CharField(source='predicted_crop', read_only=True)
+    fertilizer = serializers.CharField(source='recommended_fertilizer', read_only=True)
+    soil_params = serializers.DictField(read_only=True)
+
     class Meta:
-        model = PredictionHistory
+        model = CropRecommendation
         fields = ['id', 'prediction_date', 'crop', 'fertilizer', 'soil_params']
     
-    def get_soil_params(self, obj):
-        return obj.soil_params
-    
 
 # api/serializers.py
 
 
+class DetectionBoxSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DetectionBox
+        fields = ['class_name', 'confidence', 'x1', 'y1', 'x2', 'y2']
+
+
 class PlantDiseaseDetectionSerializer(serializers.ModelSerializer):
+    result_image = serializers.SerializerMethodField()
+    boxes = DetectionBoxSerializer(many=True, read_only=True)
+
     class Meta:
         model = PlantDiseaseDetection
-        fields = ['id', 'image', 'detected_classes', 'result_image', 'created_at']
-        read_only_fields = ['detected_classes', 'result_image', 'created_at']
\ No newline at end of file
+        fields = ['id', 'image', 'thumbnail', 'detected_classes', 'boxes', 'result_image', 'created_at']
+        read_only_fields = ['thumbnail', 'detected_classes', 'created_at']
+
+    def get_result_image(self, obj):
+        # Until it has been rendered, point at the view that renders it
+        if obj.result_image:
+            url = obj.result_image.url
+        elif obj.model_version:
+            url = reverse('plant-disease-result', args=[result_token(obj)])
+        else:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class DetectionBoxListSerializer(DetectionBoxSerializer):
+    class Meta(DetectionBoxSerializer.Meta):
+        fields = ['detection'] + DetectionBoxSerializer.Meta.fields
+
+
+class DetectionJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    detection = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DetectionJob
+        fields = ['job_id', 'status', 'attempts', 'error', 'created_at', 'finished_at', 'detection']
+
+    def get_detection(self, obj):
+        if obj.status != DetectionJob.DONE:
+            return None
+        return PlantDiseaseDetectionSerializer(obj.detection, context=self.context).data
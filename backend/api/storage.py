@@ -0,0 +1,86 @@
+"""
+Content-addressed storage for detection images.
+
+Files are named after the SHA-256 of their bytes, e.g.
+``plant_disease_images/3f/3fa9…c1.jpg``, so the same bytes are stored once
+no matter how many detections use them, and a stored name never changes what
+it points to. Saving bytes that are already stored writes nothing but
+touches a local file, so ``cleanup_media`` treats it as freshly uploaded. The
+directory and extension come from the name Django asks for; the rest of that
+name is ignored.
+
+ContentAddressedMixin only uses the Storage API, so it can be combined with
+any storage backend; ContentAddressedStorage is the local filesystem one.
+
+Shared files mean deleting a detection must not delete its files;
+``manage.py cleanup_media`` removes files no detection references.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+CONTENT_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_NAME.match(os.path.basename(name)))
+
+
+class ContentAddressedMixin:
+    """Content addressing for any ``Storage`` class, through the Storage API.
+
+    Only the touch and rename need a filesystem; on any backend other than
+    FileSystemStorage (object stores) the touch is skipped and the object is
+    written directly, which such backends publish whole.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # _save derives the final name from the content
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        extension = EXTENSION_ALIASES.get(extension, extension)
+        content_hash = digest.hexdigest()
+        name = os.path.join(directory, content_hash[:2], content_hash + extension)
+        if self.exists(name):
+            self._touch(name)
+            return name
+        path = self._local_path(name)
+        if path is None:
+            return super()._save(name, content)
+        # Write under a unique name and rename into place, so concurrent saves
+        # of the same bytes never expose a partly written file
+        partial = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(partial), path)
+        return name
+
+    def _touch(self, name):
+        # The row about to reference this file is not saved yet; refresh the
+        # mtime so cleanup_media's age check keeps an old orphan. Elsewhere
+        # cleanup_media's re-check against the database covers it.
+        path = self._local_path(name)
+        if path is not None:
+            os.utime(path)
+
+    def _local_path(self, name):
+        # Some non-local backends (e.g. InMemoryStorage) still implement path()
+        return self.path(name) if isinstance(self, FileSystemStorage) else None
+
+
+@deconstructible
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    """Content-addressed media on the local filesystem."""
+
+
+content_storage = ContentAddressedStorage()
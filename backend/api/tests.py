@@ -1,3 +1,451 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from pest_recognition.backends import Detections
+from users.models import User
+
+from . import jobs
+from .admin import CropRecommendationAdmin
+from .management.commands.cleanup_media import Command as CleanupMediaCommand
+from .models import (
+    CropRecommendation, CropRollup, DetectionBox, DetectionJob, DiseaseRollup, PlantDiseaseDetection
+)
+from .rollups import rebuild, record_detections
+from .storage import ContentAddressedMixin
+
+SOIL_SAMPLE = {
+    'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'ph': 6.5,
+    'rainfall': 202.9, 'humidity': 82.0, 'temperature': 20.9,
+}
+
+
+class CropPredictionWriteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', password='password')
+        self.client.force_authenticate(self.user)
+
+    # One insert for the prediction rows and one upsert for the weekly rollup,
+    # inside a savepoint (the test case's transaction turns atomic() into one)
+    def test_single_prediction_is_one_insert(self):
+        self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')  # warm the model
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CropRecommendation.objects.filter(user=self.user).count(), 2)
+
+    def test_batch_prediction_is_one_insert(self):
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                reverse('predict_crop_batch'), {'samples': [SOIL_SAMPLE] * 5}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 5)
+
+    def test_prediction_appears_in_history(self):
+        created = self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json').data
+        response = self.client.get(reverse('prediction-history-list'))
+        self.assertEqual(response.status_code, 200)
+        [entry] = response.data['results']
+        self.assertEqual(entry['id'], created['id'])
+        self.assertEqual(entry['crop'], created['predicted_crop'])
+        self.assertEqual(entry['fertilizer'], created['recommended_fertilizer'])
+        self.assertEqual(entry['soil_params']['n'], 90)
+
+
+class HistoryExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', password='password')
+        self.client.force_authenticate(self.user)
+        CropRecommendation.objects.bulk_create([
+            CropRecommendation(user=self.user, predicted_crop=crop, recommended_fertilizer='Urea', **SOIL_SAMPLE)
+            for crop in ['rice', 'maize', 'rice']
+        ])
+        other = User.objects.create_user('neighbour', password='password')
+        CropRecommendation.objects.create(
+            user=other, predicted_crop='rice', recommended_fertilizer='Urea', **SOIL_SAMPLE
+        )
+
+    def export(self, name, suffix, **params):
+        response = self.client.get(reverse(name, kwargs={'file_format': suffix}), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_predictions_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('export-predictions', 'csv', crop='rice').decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['crop'], 'rice')
+        self.assertEqual(float(rows[0]['n']), 90)
+
+    def test_predictions_ndjson_matches_history_api(self):
+        lines = self.export('export-predictions', 'ndjson').decode().splitlines()
+        history = self.client.get(reverse('prediction-history-list')).json()['results']
+        self.assertEqual([json.loads(line) for line in lines], history)
+
+    def test_gzip(self):
+        url = reverse('export-predictions', kwargs={'file_format': 'csv', 'compressed': '.gz'})
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('predictions-', response['Content-Disposition'])
+        text = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(len(text.splitlines()), 4)
+
+    def test_invalid_date_is_rejected(self):
+        response = self.client.get(reverse('export-predictions', kwargs={'file_format': 'csv'}),
+                                   {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detections_by_class(self):
+        detection = PlantDiseaseDetection.objects.create(
+            user=self.user, image='plant_disease_images/leaf.jpg', detected_classes=['rust', 'rust']
+        )
+        DetectionBox.objects.create(detection=detection, class_name='rust', confidence=0.9, x1=0, y1=0, x2=1, y2=1)
+        PlantDiseaseDetection.objects.create(user=self.user, image='plant_disease_images/other.jpg')
+        [line] = self.export('export-detections', 'ndjson', class_name='rust').decode().splitlines()
+        row = json.loads(line)
+        self.assertEqual(row['detected_classes'], ['rust', 'rust'])
+        self.assertTrue(row['image'].endswith('/media/plant_disease_images/leaf.jpg'))
+
+
+def image_bytes(shade):
+    import cv2
+    import numpy as np
+
+    return cv2.imencode('.png', np.full((32, 32, 3), shade, dtype=np.uint8))[1].tobytes()
+
+
+def fake_detect_batch(images):
+    return [Detections([[0, 0, 16, 16]], [0.9], [0]) for _ in images], {0: 'rust'}
+
+
+@mock.patch('api.scan.model_version', return_value='test-model')
+class PlantDiseaseScanTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user('farmer', password='password')
+        self.client.force_authenticate(self.user)
+
+    def scan(self, **data):
+        with mock.patch('api.scan.detect_batch', side_effect=fake_detect_batch) as detect_batch:
+            response = self.client.post(reverse('plant-disease-scan'), data, format='multipart')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return lines, detect_batch
+
+    def test_images_stream_one_line_each(self, _):
+        lines, _ = self.scan(images=[
+            SimpleUploadedFile('a.png', image_bytes(0)),
+            SimpleUploadedFile('bad.jpg', b'not an image'),
+            SimpleUploadedFile('b.png', image_bytes(255)),
+        ])
+        *results, summary = lines
+        self.assertEqual([(line['name'], line['status']) for line in results],
+                         [('a.png', 'ok'), ('bad.jpg', 'error'), ('b.png', 'ok')])
+        self.assertEqual(results[0]['detection']['detected_classes'], ['rust'])
+        self.assertEqual(results[1]['error'], "Could not decode image.")
+        self.assertEqual(summary['summary']['failed'], 1)
+        self.assertEqual(summary['summary']['classes']['rust']['images'], 2)
+
+    def test_zip_archive(self, _):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('field/a.png', image_bytes(0))
+            zf.writestr('field/notes.txt', 'skipped')
+            zf.writestr('field/broken.jpg', b'not an image')
+        lines, _ = self.scan(archive=SimpleUploadedFile('field.zip', archive.getvalue()))
+        self.assertEqual([(line['name'], line['status']) for line in lines[:-1]],
+                         [('a.png', 'ok'), ('broken.jpg', 'error')])
+        self.assertEqual(lines[-1]['summary']['images'], 2)
+
+    def test_repeated_image_is_inferred_once(self, _):
+        lines, detect_batch = self.scan(images=[
+            SimpleUploadedFile('a.png', image_bytes(0)), SimpleUploadedFile('copy.png', image_bytes(0)),
+        ])
+        self.assertEqual(len(detect_batch.call_args.args[0]), 1)
+        self.assertEqual([line['cached'] for line in lines[:-1]], [False, True])
+        self.assertEqual(PlantDiseaseDetection.objects.filter(user=self.user).count(), 2)
+
+    @mock.patch('api.scan.MAX_IMAGES', 2)
+    def test_image_limit(self, _):
+        images = [SimpleUploadedFile(f'{shade}.png', image_bytes(shade)) for shade in range(3)]
+        response = self.client.post(reverse('plant-disease-scan'), {'images': images}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for shade in range(3):
+                zf.writestr(f'{shade}.png', image_bytes(shade))
+        response = self.client.post(
+            reverse('plant-disease-scan'), {'archive': SimpleUploadedFile('field.zip', archive.getvalue())},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class DetectionJobTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user('farmer', password='password')
+        self.job = jobs.enqueue(PlantDiseaseDetection.objects.create(user=user, image='a.jpg'))
+
+    def test_one_worker_holds_a_claim(self):
+        job = jobs.claim('worker-a')
+        self.assertEqual((job.pk, job.status, job.claimed_by, job.attempts),
+                         (self.job.pk, DetectionJob.RUNNING, 'worker-a', 1))
+        self.assertIsNone(jobs.claim('worker-b'))
+
+    def test_expired_lease_is_taken_over(self):
+        job = jobs.claim('worker-a')
+        DetectionJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        takeover = jobs.claim('worker-b')
+        self.assertEqual((takeover.claimed_by, takeover.attempts), ('worker-b', 2))
+        with self.assertRaises(jobs.LeaseLost):
+            jobs.complete(job, 'worker-a')
+        jobs.complete(takeover, 'worker-b')
+        self.assertEqual(DetectionJob.objects.get(pk=job.pk).status, DetectionJob.DONE)
+
+    def test_failed_job_is_retried_until_out_of_attempts(self):
+        with mock.patch('api.jobs.run_detection', side_effect=RuntimeError('boom')), \
+                self.assertLogs('api.jobs', 'ERROR'):
+            for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+                job = jobs.claim('worker-a')
+                self.assertEqual(job.attempts, attempt)
+                jobs.process(job, 'worker-a')
+        job = DetectionJob.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.error), (DetectionJob.FAILED, 'RuntimeError: boom'))
+        self.assertIsNone(jobs.claim('worker-a'))
+
+    def test_result_and_completion_are_saved_together(self):
+        def run_detection(detection, on_saved):
+            on_saved()
+
+        job = jobs.claim('worker-a')
+        with mock.patch('api.jobs.run_detection', side_effect=run_detection):
+            jobs.process(job, 'worker-a')
+        self.assertEqual(DetectionJob.objects.get(pk=job.pk).status, DetectionJob.DONE)
+
+
+class DetectionBoxListTests(APITestCase):
+    def test_boxes_are_cursor_paginated(self):
+        user = User.objects.create_user('farmer', password='password')
+        self.client.force_authenticate(user)
+        detection = PlantDiseaseDetection.objects.create(user=user, image='a.jpg')
+        DetectionBox.objects.bulk_create([
+            DetectionBox(detection=detection, class_name='rust', confidence=score / 10, x1=0, y1=0, x2=1, y2=1)
+            for score in (5, 9, 9, 7)
+        ])
+        first = self.client.get(reverse('plant-disease-boxes'), {'page_size': 3}).data
+        self.assertEqual([box['confidence'] for box in first['results']], [0.9, 0.9, 0.7])
+        rest = self.client.get(first['next']).data
+        self.assertEqual([box['confidence'] for box in rest['results']], [0.5])
+        self.assertIsNone(rest['next'])
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', password='password', farm_location='Nashik')
+        self.client.force_authenticate(self.user)
+
+    def test_predictions_update_rollups(self):
+        self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')
+        self.client.post(reverse('predict_crop_batch'), {'samples': [SOIL_SAMPLE] * 3}, format='json')
+        [rollup] = CropRollup.objects.all()
+        self.assertEqual((rollup.region, rollup.predictions), ('Nashik', 4))
+        self.assertEqual(rollup.week.weekday(), 0)
+
+    def test_detections_and_rebuild_agree(self):
+        detections = [
+            PlantDiseaseDetection.objects.create(user=self.user, image='a.jpg', detected_classes=classes)
+            for classes in (['rust', 'rust', 'blight'], ['rust'], [])
+        ]
+        record_detections(detections)
+        CropRecommendation.objects.create(
+            user=self.user, predicted_crop='rice', recommended_fertilizer='Urea', **SOIL_SAMPLE
+        )
+        counted = sorted(DiseaseRollup.objects.values_list('class_name', 'detections', 'boxes'))
+        self.assertEqual(counted, [('blight', 1, 1), ('rust', 2, 3)])
+
+        self.assertEqual(rebuild(), (1, 2))
+        self.assertEqual(sorted(DiseaseRollup.objects.values_list('class_name', 'detections', 'boxes')), counted)
+        self.assertEqual(CropRollup.objects.get().predictions, 1)
+
+    def test_region_is_fixed_when_saved(self):
+        self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')
+        self.user.farm_location = 'Pune'
+        self.user.save()
+        self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')
+        rebuild()
+        self.assertEqual(
+            sorted(CropRollup.objects.values_list('region', 'predictions')), [('Nashik', 1), ('Pune', 1)]
+        )
+
+    def test_weekly_analytics(self):
+        self.client.post(reverse('predict_crop_batch'), {'samples': [SOIL_SAMPLE] * 2}, format='json')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('analytics-weekly'), {'region': 'Nashik'})
+        [week] = response.data['weeks']
+        self.assertEqual(week['region'], 'Nashik')
+        self.assertEqual(week['crops'][0]['predictions'], 2)
+        self.assertEqual(week['diseases'], [])
+        self.assertEqual(self.client.get(reverse('analytics-weekly'), {'weeks': '0'}).status_code, 400)
+
+
+class AdminChangelistTests(APITestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', password='password')
+        self.client.force_login(admin)
+        self.batches = 0
+
+    def add_rows(self, count):
+        users = User.objects.bulk_create([User(username=f'farmer{self.batches}-{i}') for i in range(count)])
+        self.batches += 1
+        CropRecommendation.objects.bulk_create([
+            CropRecommendation(user=user, predicted_crop='rice', recommended_fertilizer='Urea', **SOIL_SAMPLE)
+            for user in users
+        ])
+        PlantDiseaseDetection.objects.bulk_create([
+            PlantDiseaseDetection(user=user, image='a.jpg', detected_classes=['rust', 'rust', 'blight'])
+            for user in users
+        ])
+
+    def queries(self, url, **params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for model in ('croprecommendation', 'plantdiseasedetection'):
+            url = reverse(f'admin:api_{model}_changelist')
+            self.add_rows(5)
+            small = [self.queries(url), self.queries(url, q='farmer0-1')]
+            self.add_rows(60)
+            self.assertEqual([self.queries(url), self.queries(url, q='farmer0-1')], small)
+
+    def test_prefix_search_ignores_case(self):
+        self.add_rows(2)
+        CropRecommendation.objects.filter(user__username='farmer0-1').update(
+            predicted_crop='Maize', recommended_fertilizer='DAP + Urea'
+        )
+        url = reverse('admin:api_croprecommendation_changelist')
+        for term in ('mai', 'dap', 'FARMER0-1', 'maize farmer0', 'RIC'):
+            self.assertEqual(self.client.get(url, {'q': term}).context['cl'].result_count, 1, term)
+        # Prefixes only: "Urea" inside "DAP + Urea" and "aize" inside "Maize" are not matched
+        self.assertEqual(self.client.get(url, {'q': 'urea'}).context['cl'].result_count, 1)
+        self.assertEqual(self.client.get(url, {'q': 'aize'}).context['cl'].result_count, 0)
+        self.assertContains(self.client.get(url), 'ignoring case')
+
+    def test_filtered_changelist_counts_every_row(self):
+        self.add_rows(12)
+        url = reverse('admin:api_croprecommendation_changelist')
+        with mock.patch('api.pagination.EstimatedCountPaginator.estimate_above', 5), \
+                mock.patch.object(CropRecommendationAdmin, 'list_per_page', 5):
+            response = self.client.get(url, {'predicted_crop': 'rice', 'p': '3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 12)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+    def test_detected_classes_summary(self):
+        self.add_rows(1)
+        response = self.client.get(reverse('admin:api_plantdiseasedetection_changelist'))
+        self.assertContains(response, 'rust ×2, blight')
+
+
+class ContentAddressedMediaTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user('farmer', password='password')
+
+    def detection(self, data, name='Leaf1.JPEG'):
+        detection = PlantDiseaseDetection(user=self.user)
+        detection.image.save(name, ContentFile(data), save=True)
+        return detection
+
+    def test_identical_bytes_are_stored_once(self):
+        first, second = self.detection(b'leaf'), self.detection(b'leaf', name='copy.jpg')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^plant_disease_images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertNotEqual(self.detection(b'other leaf').image.name, first.image.name)
+
+    def test_cleanup_deletes_only_unreferenced_files(self):
+        kept = self.detection(b'kept')
+        dropped = self.detection(b'dropped')
+        storage, orphan = dropped.image.storage, dropped.image.name
+        dropped.delete()
+        call_command('cleanup_media', min_age_hours=0, stdout=io.StringIO())
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertFalse(storage.exists(orphan))
+
+    def test_saving_stored_bytes_refreshes_mtime(self):
+        path = self.detection(b'leaf').image.path
+        os.utime(path, (0, 0))
+        self.detection(b'leaf')
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+
+    def test_works_without_a_local_filesystem(self):
+        from django.core.files.storage import InMemoryStorage
+
+        class MemoryContentStorage(ContentAddressedMixin, InMemoryStorage):
+            pass
+
+        storage = MemoryContentStorage()
+        first = storage.save('plant_disease_images/leaf.JPEG', ContentFile(b'leaf'))
+        self.assertEqual(storage.save('plant_disease_images/copy.jpg', ContentFile(b'leaf')), first)
+        self.assertRegex(first, r'^plant_disease_images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        with storage.open(first) as f:
+            self.assertEqual(f.read(), b'leaf')
+        self.assertEqual(storage.listdir(os.path.dirname(first))[1], [os.path.basename(first)])
+
+    def test_cleanup_keeps_file_referenced_after_scan(self):
+        dropped = self.detection(b'dropped')
+        storage, orphan = dropped.image.storage, dropped.image.name
+        dropped.delete()
+        os.utime(storage.path(orphan), (0, 0))
+        walk = CleanupMediaCommand._walk
+
+        def walk_after_new_upload(command, storage, directory):
+            # The referenced set is already built when the walk starts
+            if not PlantDiseaseDetection.objects.filter(image=orphan).exists():
+                PlantDiseaseDetection.objects.create(user=self.user, image=orphan)
+            yield from walk(command, storage, directory)
+
+        with mock.patch.object(CleanupMediaCommand, '_walk', walk_after_new_upload):
+            call_command('cleanup_media', min_age_hours=1, stdout=io.StringIO())
+        self.assertTrue(storage.exists(orphan))
+
+
+@override_settings(METRICS_TOKEN='scrape-secret')
+@mock.patch('farm_help_project.metrics.ENABLED', True)
+class MetricsAccessTests(APITestCase):
+    def test_requires_token_or_staff(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -1,6 +1,6 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from .views import CropPredictionView,PredictionHistoryViewSet,PlantDiseaseDetectionView
+from .views import CropPredictionView,CropBatchPredictionView,PredictionHistoryViewSet,PlantDiseaseDetectionView,DetectionJobStatusView,DetectionResultImageView,DetectionBoxListView,PlantDiseaseScanView,ModelReadinessView,CacheStatsView,PredictionExportView,DetectionExportView,WeeklyAnalyticsView
 
 
 
@@ -9,7 +9,19 @@ router.register(r'prediction-history', PredictionHistoryViewSet, basename='predi
 
 urlpatterns = [
     path('predict-crop/', CropPredictionView.as_view(), name='predict_crop'),
+    path('predict-crop/batch/', CropBatchPredictionView.as_view(), name='predict_crop_batch'),
     path('plant-disease/', PlantDiseaseDetectionView.as_view(), name='pest-recognition'),
+    path('plant-disease/scan/', PlantDiseaseScanView.as_view(), name='plant-disease-scan'),
+    path('plant-disease/jobs/<int:pk>/', DetectionJobStatusView.as_view(), name='plant-disease-job'),
+    path('plant-disease/results/<str:token>/', DetectionResultImageView.as_view(), name='plant-disease-result'),
+    path('plant-disease/boxes/', DetectionBoxListView.as_view(), name='plant-disease-boxes'),
+    re_path(r'^export/predictions\.(?P<file_format>csv|ndjson)(?P<compressed>\.gz)?$',
+            PredictionExportView.as_view(), name='export-predictions'),
+    re_path(r'^export/detections\.(?P<file_format>csv|ndjson)(?P<compressed>\.gz)?$',
+            DetectionExportView.as_view(), name='export-detections'),
+    path('analytics/weekly/', WeeklyAnalyticsView.as_view(), name='analytics-weekly'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('health/ready/', ModelReadinessView.as_view(), name='model-readiness'),
     path('', include(router.urls)),
 ]
 
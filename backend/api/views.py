@@ -1,25 +1,41 @@
 from rest_framework import generics, permissions, status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from api.models import CropRecommendation
-from crop_prediction.prediction import predict_crop, recommend_fertilizer
-from .serializers import CropRecommendationSerializer
-from users.models import User
-from .serializers import PlantDiseaseDetectionSerializer
-from api.models import PredictionHistory
+from crop_prediction.prediction import (
+    FEATURES, prediction_cache, predict_crop, predict_crops, recommend_fertilizer, recommend_fertilizers
+)
+from .serializers import CropRecommendationSerializer, CropBatchPredictionSerializer
+from .serializers import PlantDiseaseDetectionSerializer, DetectionJobSerializer, DetectionBoxListSerializer
+from api.models import PlantDiseaseDetection, DetectionJob, DetectionBox
+from api import export as export_stream, jobs, rollups, scan
+from api.detection import (
+    content_hash, decode_image, dedup_stats, detect, detection_for_token, ensure_result_image, find_cached,
+    read_upload, reuse_cached, save_boxes, thumbnail_file
+)
 from api.serializers import PredictionHistorySerializer
+from api.pagination import DetectionBoxPagination, PredictionHistoryPagination
 import os
 import json
+from datetime import datetime, time, timedelta
 from django.conf import settings
-from pest_recognition.inference import inference
-from django.core.files.base import ContentFile
+from django.core import signing
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from pest_recognition.inference import batcher, model_version, registry
+from farm_help_project.metrics import span
 import json
 
-import cv2
-
 # Import the inference and chatbot functions
 
 
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from django.conf import settings
 import sys
@@ -50,59 +66,161 @@ class CropPredictionView(generics.CreateAPIView):
         # Get fertilizer recommendation
         fertilizer = recommend_fertilizer(n, p, k, crop)
 
-        soil_params = {
-            'n': n,
-            'p': p,
-            'k': k,
-            'ph': ph,
-            'rainfall': rainfall,
-            'humidity': humidity,
-            'temperature': temperature
-        }
-        
-        # Save to prediction history
-        PredictionHistory.objects.create(
-            user=request.user,
-            crop=crop,
-            fertilizer=fertilizer,
-            soil_params_json=json.dumps(soil_params)
-        )
-        
-        # Render result page
-      
-        # Create recommendation record
-        user = User.objects.get(id=request.user.id)
-        recommendation = CropRecommendation.objects.create(
-            user=user,
-            nitrogen=n,
-            phosphorus=p,
-            potassium=k,
-            ph=ph,
-            rainfall=rainfall,
-            humidity=humidity,
-            temperature=temperature,
-            predicted_crop=crop,
-            recommended_fertilizer=fertilizer
-        )
+        # One row serves both this response and the prediction history
+        with span('save'), transaction.atomic():
+            recommendation = CropRecommendation.objects.create(
+                user=request.user,
+                nitrogen=n,
+                phosphorus=p,
+                potassium=k,
+                ph=ph,
+                rainfall=rainfall,
+                humidity=humidity,
+                temperature=temperature,
+                predicted_crop=crop,
+                recommended_fertilizer=fertilizer
+            )
+            rollups.record_predictions([recommendation])
         
         serializer = self.get_serializer(recommendation)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
-    
+
+
+class CropBatchPredictionView(generics.CreateAPIView):
+    """Score many soil samples with one model call and bulk-insert the results."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CropBatchPredictionSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        samples = [
+            [sample[feature] for feature in FEATURES]
+            for sample in serializer.validated_data['samples']
+        ]
+        crops = predict_crops(samples)
+        fertilizers = recommend_fertilizers(samples, crops)
+
+        region = rollups.region_of(request.user)
+        with transaction.atomic():
+            recommendations = CropRecommendation.objects.bulk_create([
+                CropRecommendation(
+                    user=request.user,
+                    region=region,
+                    predicted_crop=crop,
+                    recommended_fertilizer=fertilizer,
+                    **dict(zip(FEATURES, row))
+                )
+                for row, crop, fertilizer in zip(samples, crops, fertilizers)
+            ])
+            rollups.record_predictions(recommendations)
+
+        serializer = CropRecommendationSerializer(recommendations, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+
+
+
 
 
 
 
+class CreatedAtFilterMixin:
+    """``date_from``/``date_to`` filters on ``created_at``, as ISO dates or
+    datetimes (a bare ``date_to`` includes that whole day)."""
 
+    def filter_created_at(self, queryset):
+        params = self.request.query_params
+        if params.get('date_from'):
+            queryset = queryset.filter(created_at__gte=self.parse_bound('date_from')[0])
+        if params.get('date_to'):
+            bound, whole_day = self.parse_bound('date_to')
+            if whole_day:
+                queryset = queryset.filter(created_at__lt=bound + timedelta(days=1))
+            else:
+                queryset = queryset.filter(created_at__lte=bound)
+        return queryset
 
+    def parse_bound(self, name):
+        """Return (aware datetime, whether the value was a bare date)."""
+        value = self.request.query_params[name]
+        try:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.min) if day else parse_datetime(value)
+        except ValueError:
+            day = moment = None
+        if moment is None:
+            raise ValidationError({name: ["Use an ISO date (YYYY-MM-DD) or datetime."]})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment, day is not None
 
 
-class PredictionHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+class PredictionHistoryFilterMixin(CreatedAtFilterMixin):
+    """The requesting user's predictions, newest first, filtered by ``crop``
+    and date range; shared by the history API and its export."""
+
+    def get_queryset(self):
+        queryset = CropRecommendation.objects.filter(user=self.request.user)
+        if self.request.query_params.get('crop'):
+            queryset = queryset.filter(predicted_crop=self.request.query_params['crop'])
+        return self.filter_created_at(queryset).order_by('-created_at')
+
+
+class PredictionHistoryViewSet(PredictionHistoryFilterMixin, viewsets.ReadOnlyModelViewSet):
+    """A user's predictions, newest first, filtered by ``crop`` and date range."""
     serializer_class = PredictionHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+    pagination_class = PredictionHistoryPagination
+
+
+class HistoryExportView(CreatedAtFilterMixin, APIView):
+    """Download a user's records as ``.csv`` or ``.ndjson``, optionally ``.gz``.
+
+    The file is streamed while the rows are read, so memory use does not grow
+    with the number of records.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    export_class = None
+    filename = None
+
     def get_queryset(self):
-        return PredictionHistory.objects.filter(user=self.request.user).order_by('-prediction_date')
-    
+        raise NotImplementedError
+
+    def get(self, request, file_format, compressed=None, *args, **kwargs):
+        export = self.export_class(self.get_queryset(), request)
+        gzipped = compressed is not None
+        response = StreamingHttpResponse(
+            export_stream.encode(export.blocks(file_format), gzipped),
+            content_type='application/gzip' if gzipped else export_stream.CONTENT_TYPES[file_format],
+        )
+        name = f"{self.filename}-{timezone.localdate():%Y-%m-%d}.{file_format}{compressed or ''}"
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class PredictionExportView(PredictionHistoryFilterMixin, HistoryExportView):
+    """Prediction history export; filters as for /api/prediction-history/."""
+    export_class = export_stream.PredictionExport
+    filename = 'predictions'
+
+
+class DetectionExportView(HistoryExportView):
+    """Disease detection export, filtered by date range and ``class_name``."""
+    export_class = export_stream.DetectionExport
+    filename = 'detections'
+
+    def get_queryset(self):
+        queryset = PlantDiseaseDetection.objects.filter(user=self.request.user)
+        class_name = self.request.query_params.get('class_name')
+        if class_name:
+            queryset = queryset.filter(
+                Exists(DetectionBox.objects.filter(detection=OuterRef('pk'), class_name=class_name))
+            )
+        return self.filter_created_at(queryset).order_by('-created_at')
 
 
 
@@ -119,30 +237,221 @@ class PlantDiseaseDetectionView(generics.CreateAPIView):
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        
+
         if serializer.is_valid():
-            plant_detection = serializer.save(user=request.user)
-            image_path = plant_detection.image.path
-            
-            img = cv2.imread(image_path)
-            result_img, classes, detected_classes_indices = inference(img)
-            detected_class_names = [
-                classes[idx] if isinstance(idx, int) else idx
-                for idx in detected_classes_indices
-]            
-            result_image_name = f"result_{os.path.basename(image_path)}"
-            result_image_path = os.path.join(settings.MEDIA_ROOT, 'plant_disease_results', result_image_name)
-            os.makedirs(os.path.dirname(result_image_path), exist_ok=True)
-            
-            success, buffer = cv2.imencode('.jpg', result_img)
-            if success:
-                plant_detection.result_image.save(
-                    result_image_name,
-                    ContentFile(buffer.tobytes()),
-                    save=False
+            upload = serializer.validated_data['image']
+            with span('hash'):
+                data = read_upload(upload)
+                image_hash = content_hash(data)
+
+            # Identical bytes already processed by the current model: reuse
+            # the stored result instead of running inference again
+            with span('dedup'):
+                cached = find_cached(image_hash, model_version())
+            if cached is not None:
+                dedup_stats.hit()
+                plant_detection = reuse_cached(cached, request.user)
+                serializer = self.get_serializer(plant_detection)
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            dedup_stats.miss()
+
+            if self.wants_async(request):
+                # No detection row without its job; an orphaned upload is left for cleanup_media
+                with transaction.atomic():
+                    plant_detection = serializer.save(user=request.user, image_hash=image_hash)
+                    job = jobs.enqueue(plant_detection)
+                return Response(
+                    DetectionJobSerializer(job, context=self.get_serializer_context()).data,
+                    status=status.HTTP_202_ACCEPTED
                 )
-                plant_detection.detected_classes = detected_class_names
-                plant_detection.save()
 
+            # Decode straight from the upload buffer; the stored copy is never read back
+            try:
+                with span('decode'):
+                    img = decode_image(data)
+            except ValueError as exc:
+                return Response({'image': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+
+            version = model_version()
+            detected_class_names, boxes = detect(img)
+            # The annotated image is rendered on first request, not here
+            with span('save'), transaction.atomic():
+                plant_detection = serializer.save(
+                    user=request.user,
+                    image_hash=image_hash,
+                    detected_classes=detected_class_names,
+                    model_version=version,
+                    thumbnail=thumbnail_file(img),
+                )
+                save_boxes(plant_detection, boxes)
+                rollups.record_detections([plant_detection])
             serializer = self.get_serializer(plant_detection)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def wants_async(self, request):
+        value = request.query_params.get('async')
+        if value is None:
+            return settings.PLANT_DISEASE_ASYNC
+        return value.lower() in ('1', 'true', 'yes')
+
+
+class PlantDiseaseScanView(APIView):
+    """Scan a whole field: several ``images`` or one zip ``archive`` per request.
+
+    Results stream back as NDJSON, one line per image in upload order as soon
+    as its batch is saved, followed by a ``summary`` line with per-class
+    counts across the scan.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Spool uploads to disk instead of holding hundreds of images in memory
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        files = request.FILES.getlist('images')
+        archive = request.FILES.get('archive')
+        try:
+            if archive is not None:
+                sources = scan.iter_archive(archive, scan.archive_members(archive))
+            elif files:
+                if len(files) > scan.MAX_IMAGES:
+                    raise scan.ScanError(f"At most {scan.MAX_IMAGES} images can be scanned at once.")
+                sources = scan.iter_files(files)
+            else:
+                raise scan.ScanError("Upload one or more 'images' or a zip 'archive'.")
+        except scan.ScanError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            self.stream(sources, request.user), content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream(self, sources, user):
+        context = {'request': self.request}
+        summary = scan.ScanSummary()
+        results = scan.scan(sources, user)
+        for index, (name, plant_detection, error, cached) in enumerate(results):
+            summary.add(plant_detection, error, cached)
+            line = {'index': index, 'name': name}
+            if error is not None:
+                line.update(status='error', error=error)
+            else:
+                line.update(
+                    status='ok',
+                    cached=cached,
+                    detection=PlantDiseaseDetectionSerializer(plant_detection, context=context).data,
+                )
+            yield json.dumps(line, cls=DjangoJSONEncoder) + '\n'
+        yield json.dumps({'summary': summary.as_dict()}) + '\n'
+
+
+class DetectionJobStatusView(generics.RetrieveAPIView):
+    """Poll an asynchronous detection; the result is included once it is done."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = DetectionJobSerializer
+
+    def get_queryset(self):
+        return DetectionJob.objects.filter(detection__user=self.request.user).select_related('detection')
+
+
+
+class DetectionResultImageView(APIView):
+    """Annotated image of a detection, rendered and stored on first request.
+
+    Addressed by a signed token rather than the id so that the URL can be used
+    directly as an ``<img>`` source without credentials.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, token, *args, **kwargs):
+        try:
+            plant_detection = detection_for_token(token)
+        except (signing.BadSignature, PlantDiseaseDetection.DoesNotExist):
+            raise Http404
+        if not plant_detection.model_version:
+            raise Http404
+        ensure_result_image(plant_detection)
+        return HttpResponseRedirect(plant_detection.result_image.url)
+
+
+class DetectionBoxListView(generics.ListAPIView):
+    """The user's detected boxes, optionally of one class and above a confidence."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = DetectionBoxListSerializer
+    pagination_class = DetectionBoxPagination
+
+    def get_queryset(self):
+        queryset = DetectionBox.objects.filter(detection__user=self.request.user)
+        class_name = self.request.query_params.get('class_name')
+        if class_name:
+            queryset = queryset.filter(class_name=class_name)
+        min_confidence = self.request.query_params.get('min_confidence')
+        if min_confidence:
+            try:
+                queryset = queryset.filter(confidence__gte=float(min_confidence))
+            except ValueError:
+                raise ValidationError({'min_confidence': ["A number is required."]})
+        return queryset
+
+
+class WeeklyAnalyticsView(APIView):
+    """Top predicted crops and detected diseases per farm location and week.
+
+    Served from the rollup tables, so the cost depends on the number of weeks
+    and regions asked for, not on how many predictions exist. Query
+    parameters: ``weeks`` (default 12, at most 104), ``region`` and ``top``
+    (entries per list, default 5).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        weeks = self.int_param('weeks', 12, 1, 104)
+        top = self.int_param('top', 5, 1, 50)
+        region = request.query_params.get('region')
+        return Response({'weeks': rollups.weekly_summary(weeks, region=region, top=top)})
+
+    def int_param(self, name, default, lowest, highest):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            value = None
+        if value is None or not lowest <= value <= highest:
+            raise ValidationError({name: [f"Use a whole number from {lowest} to {highest}."]})
+        return value
+
+
+class ModelReadinessView(APIView):
+    """Readiness probe: 200 once the disease model is loaded, 503 until then."""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, *args, **kwargs):
+        if registry.is_ready():
+            return Response({'status': 'ready'})
+        return Response(
+            {'status': 'loading', 'error': registry.last_error()},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
+
+class CacheStatsView(APIView):
+    """Process-local cache and batching counters, for operators."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            'crop_prediction': prediction_cache.stats(),
+            'detection_dedup': dedup_stats.as_dict(),
+            'disease_batcher': batcher.stats(),
+        })
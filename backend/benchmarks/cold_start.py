@@ -0,0 +1,177 @@
+"""
+Cold-start benchmark: django.setup() plus first-request time per endpoint.
+
+Every measurement runs in a fresh interpreter, so each one pays exactly what a
+new worker or serverless instance would. The database is a throwaway SQLite
+file migrated once up front; the project's db.sqlite3 is never touched.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 5 --output cold_start.json
+    python benchmarks/cold_start.py --baseline cold_start.json --tolerance 0.25
+
+With --baseline, the script exits non-zero if any endpoint's setup + first
+request time regressed by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, run_child, setup
+
+HEAVY_MODULES = ('torch', 'ultralytics', 'cv2', 'sklearn', 'pandas')
+
+USERNAME = 'coldstart'
+PASSWORD = 'coldstart-password'
+
+ENDPOINTS = {
+    'token': ('post', '/users/token/', 'json'),
+    'profile': ('get', '/users/profile/', None),
+    'prediction-history': ('get', '/api/prediction-history/', None),
+    'predict-crop': ('post', '/api/predict-crop/', 'json'),
+    'plant-disease': ('post', '/api/plant-disease/', 'multipart'),
+    'health-ready': ('get', '/api/health/ready/', None),
+}
+
+CROP_SAMPLE = {
+    'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'ph': 6.5,
+    'rainfall': 202.9, 'humidity': 82.0, 'temperature': 20.9,
+}
+
+
+def prepare(db_path, media_root):
+    """Migrate the scratch database and print an access token for the bench user."""
+    setup(db_path, media_root)
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from users.models import User
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user(USERNAME, password=PASSWORD)
+    print(json.dumps({'access': str(RefreshToken.for_user(user).access_token)}))
+
+
+def measure(endpoint, db_path, media_root, token):
+    started = time.perf_counter()
+    setup(db_path, media_root)
+    setup_ms = (time.perf_counter() - started) * 1000
+
+    from django.test import Client
+
+    method, path, body = ENDPOINTS[endpoint]
+    client = Client(HTTP_HOST='coldstart.vercel.app', raise_request_exception=False)
+    headers = {} if endpoint == 'token' else {'Authorization': f'Bearer {token}'}
+
+    def request():
+        kwargs = {'headers': headers}
+        if endpoint == 'token':
+            kwargs.update(data={'username': USERNAME, 'password': PASSWORD}, content_type='application/json')
+        elif body == 'json':
+            kwargs.update(data=CROP_SAMPLE, content_type='application/json')
+        elif body == 'multipart':
+            image = os.path.join(BACKEND_DIR, 'media', 'plant_disease_images', 'Leaf1.jpg')
+            with open(image, 'rb') as f:
+                return getattr(client, method)(path, data={'image': f}, **kwargs)
+        return getattr(client, method)(path, **kwargs)
+
+    first_started = time.perf_counter()
+    response = request()
+    first_ms = (time.perf_counter() - first_started) * 1000
+
+    warm_started = time.perf_counter()
+    request()
+    warm_ms = (time.perf_counter() - warm_started) * 1000
+
+    print(json.dumps({
+        'setup_ms': setup_ms,
+        'first_request_ms': first_ms,
+        'warm_request_ms': warm_ms,
+        'total_ms': setup_ms + first_ms,
+        'status': response.status_code,
+        'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def _child(args):
+    return run_child(__file__, args, f"Child {args[:2]}")
+
+
+def run(endpoints, runs):
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, 'coldstart.sqlite3')
+        media_root = os.path.join(scratch, 'media')
+        token = _child(['--prepare', '--db', db_path, '--media', media_root])['access']
+
+        for endpoint in endpoints:
+            samples = [
+                _child(['--child', endpoint, '--db', db_path, '--media', media_root, '--token', token])
+                for _ in range(runs)
+            ]
+            results[endpoint] = {
+                key: statistics.median(sample[key] for sample in samples)
+                for key in ('setup_ms', 'first_request_ms', 'warm_request_ms', 'total_ms')
+            }
+            results[endpoint]['status'] = samples[-1]['status']
+            results[endpoint]['heavy_modules'] = samples[-1]['heavy_modules']
+    return results
+
+
+def report(results):
+    print(f"{'endpoint':<20} {'setup':>9} {'first':>9} {'warm':>9} {'total':>9}  status  heavy modules")
+    for endpoint, r in results.items():
+        print(
+            f"{endpoint:<20} {r['setup_ms']:>7.1f}ms {r['first_request_ms']:>7.1f}ms "
+            f"{r['warm_request_ms']:>7.1f}ms {r['total_ms']:>7.1f}ms  {r['status']:>6}  "
+            f"{', '.join(r['heavy_modules']) or '-'}"
+        )
+
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for endpoint, r in results.items():
+        previous = baseline.get(endpoint)
+        if previous and r['total_ms'] > previous['total_ms'] * (1 + tolerance):
+            failures.append(
+                f"{endpoint}: {r['total_ms']:.1f}ms vs baseline {previous['total_ms']:.1f}ms"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--runs', type=int, default=3, help="Fresh processes per endpoint (median is reported).")
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    parser.add_argument('--baseline', help="JSON file from a previous --output run to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown, as a fraction.")
+    parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child', choices=list(ENDPOINTS), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--media', help=argparse.SUPPRESS)
+    parser.add_argument('--token', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        return prepare(args.db, args.media)
+    if args.child:
+        return measure(args.child, args.db, args.media, args.token)
+
+    results = run(args.endpoints, args.runs)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f), args.tolerance)
+        if failures:
+            print("Cold-start regressions:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
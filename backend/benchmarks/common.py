@@ -0,0 +1,53 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Each script runs its measurements in child interpreters against throwaway
+databases; these set up Django for such a child and collect its result.
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(db_path, media_root=None, sqlite_concurrent=None):
+    """Point the project settings at a scratch database (and media folder)
+    without loading the detection model; call before ``django.setup()``."""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'farm_help_project.settings')
+    os.environ['PLANT_DISEASE_PRELOAD_MODEL'] = '0'
+    if sqlite_concurrent is not None:
+        os.environ['SQLITE_CONCURRENT'] = sqlite_concurrent
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    if media_root is not None:
+        settings.MEDIA_ROOT = media_root
+
+
+def setup(db_path, media_root=None, sqlite_concurrent=None):
+    configure(db_path, media_root, sqlite_concurrent)
+    import django
+    django.setup()
+
+
+def run_child(script, args, description):
+    """Run ``script`` with ``args`` in a fresh interpreter and return the JSON
+    object printed on its last line of output."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(script), *args],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if output.returncode != 0:
+        raise RuntimeError(f"{description} failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def percentile(values, q):
+    """Nearest-rank ``q``th percentile of ``values``; 0.0 when there are none."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
@@ -0,0 +1,167 @@
+"""
+Write-contention benchmark for the SQLite profiles.
+
+Starts N writer processes at the same instant against one scratch database.
+Each writer performs request-shaped work: it reads the user's latest history
+page, then inserts a prediction row, and then releases the connection the way
+Django's request cycle would. The script reports throughput, write latency and
+"database is locked" errors with SQLITE_CONCURRENT off ("default") and on
+("concurrent").
+
+    python benchmarks/sqlite_contention.py
+    python benchmarks/sqlite_contention.py --writers 1 4 16 --requests 300 --output contention.json
+
+The project's db.sqlite3 is never touched.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, percentile, setup
+
+PROFILES = {'default': '0', 'concurrent': '1'}
+
+SOIL_SAMPLE = {
+    'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'ph': 6.5,
+    'rainfall': 202.9, 'humidity': 82.0, 'temperature': 20.9,
+}
+
+
+def prepare(db_path, writers):
+    """Migrate a template database with one user per writer."""
+    setup(db_path, sqlite_concurrent=PROFILES['default'])
+    from django.core.management import call_command
+    from users.models import User
+
+    call_command('migrate', verbosity=0)
+    User.objects.bulk_create([User(username=f'writer{i}') for i in range(writers)])
+
+
+def write(profile, db_path, writer, requests, start_at):
+    setup(db_path, sqlite_concurrent=PROFILES[profile])
+    from django.db import OperationalError, close_old_connections, connection
+    from api.models import CropRecommendation
+    from users.models import User
+
+    user = User.objects.get(username=f'writer{writer}')
+    connection.close()
+
+    latencies = []
+    errors = 0
+    time.sleep(max(0.0, start_at - time.time()))
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        try:
+            list(CropRecommendation.objects.filter(user=user).order_by('-created_at')[:20])
+            CropRecommendation.objects.create(
+                user=user, predicted_crop='rice', recommended_fertilizer='Urea', **SOIL_SAMPLE
+            )
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            errors += 1
+        else:
+            latencies.append((time.perf_counter() - request_started) * 1000)
+        # End of "request": closes the connection unless CONN_MAX_AGE keeps it
+        close_old_connections()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({'latencies_ms': latencies, 'errors': errors, 'elapsed_s': elapsed}))
+
+
+def run_profile(profile, template, writers, requests):
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, 'contention.sqlite3')
+        shutil.copy(template, db_path)
+        start_at = time.time() + 3  # leave time for every child to import Django
+        children = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--child', profile, '--db', db_path,
+                 '--writer', str(i), '--requests', str(requests), '--start-at', str(start_at)],
+                cwd=BACKEND_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            )
+            for i in range(writers)
+        ]
+        samples = []
+        for child in children:
+            stdout, stderr = child.communicate()
+            if child.returncode != 0:
+                raise RuntimeError(f"Writer failed:\n{stderr}")
+            samples.append(json.loads(stdout.strip().splitlines()[-1]))
+
+    latencies = [ms for sample in samples for ms in sample['latencies_ms']]
+    wall = max(sample['elapsed_s'] for sample in samples)
+    return {
+        'writers': writers,
+        'writes': len(latencies),
+        'lock_errors': sum(sample['errors'] for sample in samples),
+        'throughput_per_s': len(latencies) / wall if wall else 0.0,
+        'p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def run(writer_counts, requests, profiles):
+    results = {profile: [] for profile in profiles}
+    with tempfile.TemporaryDirectory() as scratch:
+        template = os.path.join(scratch, 'template.sqlite3')
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--prepare', '--db', template,
+             '--writers', str(max(writer_counts))],
+            cwd=BACKEND_DIR, capture_output=True, text=True,
+        )
+        if output.returncode != 0:
+            raise RuntimeError(f"Preparing the database failed:\n{output.stderr}")
+        for writers in writer_counts:
+            for profile in profiles:
+                results[profile].append(run_profile(profile, template, writers, requests))
+    return results
+
+
+def report(results):
+    print(f"{'profile':<12} {'writers':>7} {'writes':>7} {'locked':>7} {'writes/s':>9} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8}")
+    for profile, rows in results.items():
+        for r in rows:
+            print(
+                f"{profile:<12} {r['writers']:>7} {r['writes']:>7} {r['lock_errors']:>7} "
+                f"{r['throughput_per_s']:>9.1f} {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', nargs='+', type=int, default=[1, 4, 8, 16],
+                        help="Numbers of parallel writer processes to try.")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per writer.")
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child', choices=list(PROFILES), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--writer', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        return prepare(args.db, max(args.writers))
+    if args.child:
+        return write(args.child, args.db, args.writer, args.requests, args.start_at)
+
+    results = run(args.writers, args.requests, args.profiles)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Latency, throughput and memory benchmarks for predictions, inference and the API.
+
+Each benchmark runs in a fresh interpreter, so its peak RSS is its own, against
+a throwaway SQLite database and media folder; the project's db.sqlite3 and
+media files are never modified.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --only crop-single crop-batch --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --tolerance 0.2
+
+Benchmarks:
+    crop-single             predict_crop() per crop_rec.csv row
+    crop-batch              predict_crops() over --batch-size rows at a time
+    fertilizer              recommend_fertilizer() per crop_rec.csv row
+    inference               pest_recognition inference() per image
+    api-predict-crop        POST /api/predict-crop/
+    api-plant-disease       POST /api/plant-disease/
+    api-prediction-history  GET /api/prediction-history/
+
+API benchmarks authenticate with a real JWT from /users/token/. Disease
+benchmarks are skipped when the detection weights are missing; point
+PLANT_DISEASE_WEIGHTS at a file to run them. With --baseline, the script exits
+non-zero when p50/p95 latency or peak RSS grew, or throughput fell, by more
+than the tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, percentile, run_child, setup
+
+CROP_REC_CSV = os.path.join(os.path.dirname(BACKEND_DIR), 'crop_rec.csv')
+IMAGES_DIR = os.path.join(BACKEND_DIR, 'media', 'plant_disease_images')
+
+USERNAME = 'benchmark'
+PASSWORD = 'benchmark-password'
+
+# Compared against the baseline: metric -> whether larger is worse
+REGRESSION_METRICS = {'p50_ms': True, 'p95_ms': True, 'throughput_per_s': False, 'peak_rss_mb': True}
+
+
+def _csv_rows(limit):
+    from crop_prediction.management.commands.compile_crop_model import load_csv_features
+
+    return load_csv_features(CROP_REC_CSV)[:limit].tolist()
+
+
+def _images(limit):
+    from pest_recognition.evaluation import load_images
+
+    return load_images(IMAGES_DIR)[:limit]
+
+
+def _disease_weights():
+    from pest_recognition.inference import WEIGHTS_PATH
+
+    return WEIGHTS_PATH if os.path.exists(WEIGHTS_PATH) else None
+
+
+def _predict_crop_kwargs(row):
+    """predict_crop() keyword arguments for a CSV_COLUMNS-ordered row (N -> n, ...)."""
+    from crop_prediction.prediction import CSV_COLUMNS
+
+    return {column.lower(): value for column, value in zip(CSV_COLUMNS, row)}
+
+
+def bench_crop_single(args):
+    from crop_prediction.prediction import predict_crop, prediction_cache
+
+    rows = [_predict_crop_kwargs(row) for row in _csv_rows(args.rows)]
+    predict_crop(**rows[0])
+    prediction_cache.clear()
+    return [lambda row=row: predict_crop(**row) for row in rows], 1
+
+
+def bench_crop_batch(args):
+    from crop_prediction.prediction import predict_crops, prediction_cache
+
+    rows = _csv_rows(args.rows)
+    predict_crops(rows[:1])
+    prediction_cache.clear()
+    size = args.batch_size
+    batches = [rows[i:i + size] for i in range(0, len(rows), size)]
+    return [lambda batch=batch: predict_crops(batch) for batch in batches], size
+
+
+def bench_fertilizer(args):
+    from crop_prediction.prediction import CROP_LABELS, recommend_fertilizer
+
+    rows = _csv_rows(args.rows)
+    crops = list(CROP_LABELS.values())
+    return [
+        lambda row=row, crop=crops[i % len(crops)]: recommend_fertilizer(row[0], row[1], row[2], crop)
+        for i, row in enumerate(rows)
+    ], 1
+
+
+def bench_inference(args):
+    if _disease_weights() is None:
+        return None
+    from pest_recognition.inference import inference, registry
+
+    images = _images(args.images)
+    registry.get()
+    return [lambda img=img: inference(img) for _, img in images], 1
+
+
+def _api_client():
+    from rest_framework.test import APIClient
+    from users.models import User
+
+    User.objects.create_user(USERNAME, password=PASSWORD)
+    client = APIClient(HTTP_HOST='benchmark.vercel.app')
+    response = client.post('/users/token/', {'username': USERNAME, 'password': PASSWORD}, format='json')
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    return client
+
+
+def _expect(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f"Expected {status}, got {response.status_code}: {response.content[:200]!r}")
+
+
+def bench_api_predict_crop(args):
+    from crop_prediction.prediction import FEATURES
+
+    client = _api_client()
+    samples = [dict(zip(FEATURES, row)) for row in _csv_rows(args.rows)]
+    return [
+        lambda sample=sample: _expect(client.post('/api/predict-crop/', sample, format='json'), 201)
+        for sample in samples
+    ], 1
+
+
+def bench_api_plant_disease(args):
+    import io
+
+    if _disease_weights() is None:
+        return None
+    from pest_recognition.inference import registry
+
+    client = _api_client()
+    registry.get()
+    uploads = []
+    for i, path in enumerate(sorted(os.listdir(IMAGES_DIR))[:args.images]):
+        with open(os.path.join(IMAGES_DIR, path), 'rb') as f:
+            # Bytes after the JPEG end marker are ignored by decoders but make
+            # every upload unique, so the duplicate-upload cache never hits
+            uploads.append((path, f.read() + i.to_bytes(4, 'big')))
+
+    def upload(name, data):
+        image = io.BytesIO(data)
+        image.name = name
+        _expect(client.post('/api/plant-disease/', {'image': image}, format='multipart'), 201)
+
+    return [lambda name=name, data=data: upload(name, data) for name, data in uploads], 1
+
+
+def bench_api_prediction_history(args):
+    from api.models import CropRecommendation
+    from crop_prediction.prediction import FEATURES
+    from users.models import User
+
+    client = _api_client()
+    user = User.objects.get(username=USERNAME)
+    CropRecommendation.objects.bulk_create([
+        CropRecommendation(user=user, predicted_crop='rice', recommended_fertilizer='Urea',
+                           **dict(zip(FEATURES, row)))
+        for row in _csv_rows(args.history_rows)
+    ])
+    return [
+        lambda: _expect(client.get('/api/prediction-history/'), 200)
+        for _ in range(args.requests)
+    ], 1
+
+
+BENCHMARKS = {
+    'crop-single': bench_crop_single,
+    'crop-batch': bench_crop_batch,
+    'fertilizer': bench_fertilizer,
+    'inference': bench_inference,
+    'api-predict-crop': bench_api_predict_crop,
+    'api-plant-disease': bench_api_plant_disease,
+    'api-prediction-history': bench_api_prediction_history,
+}
+
+
+def measure(name, args):
+    setup(args.db, args.media)
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    prepared = BENCHMARKS[name](args)
+    if prepared is None:
+        print(json.dumps({'skipped': "detection weights not found"}))
+        return
+    operations, items_per_op = prepared
+
+    # Warm-up operations are not repeated, so nothing measured is a cache hit
+    count = min(args.warmup, len(operations) - 1)
+    warmup, operations = operations[:count], operations[count:]
+    for operation in warmup:
+        operation()
+    latencies = []
+    started = time.perf_counter()
+    for operation in operations:
+        op_started = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - op_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'operations': len(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'throughput_per_s': len(latencies) * items_per_op / elapsed if elapsed else 0.0,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def _child(name, args, scratch):
+    db_path = os.path.join(scratch, f'{name}.sqlite3')
+    media_root = os.path.join(scratch, f'{name}-media')
+    forwarded = [
+        *(['--rows', str(args.rows)] if args.rows else []), '--batch-size', str(args.batch_size), '--images', str(args.images),
+        '--requests', str(args.requests), '--history-rows', str(args.history_rows),
+        '--warmup', str(args.warmup),
+    ]
+    return run_child(
+        __file__, ['--child', name, '--db', db_path, '--media', media_root, *forwarded], f"Benchmark {name}"
+    )
+
+
+def run(names, args):
+    with tempfile.TemporaryDirectory() as scratch:
+        return {name: _child(name, args, scratch) for name in names}
+
+
+def report(results):
+    print(f"{'benchmark':<24} {'ops':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'items/s':>10} {'peak RSS':>9}")
+    for name, r in results.items():
+        if 'skipped' in r:
+            print(f"{name:<24} skipped: {r['skipped']}")
+            continue
+        print(
+            f"{name:<24} {r['operations']:>6} {r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms "
+            f"{r['p99_ms']:>7.2f}ms {r['throughput_per_s']:>10.1f} {r['peak_rss_mb']:>7.1f}MB"
+        )
+
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for name, r in results.items():
+        previous = baseline.get(name)
+        if not previous or 'skipped' in r or 'skipped' in previous:
+            continue
+        for metric, larger_is_worse in REGRESSION_METRICS.items():
+            old, new = previous[metric], r[metric]
+            if larger_is_worse and new > old * (1 + tolerance) or \
+                    not larger_is_worse and new < old * (1 - tolerance):
+                failures.append(f"{name} {metric}: {new:.2f} vs baseline {old:.2f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--rows', type=int, help="crop_rec.csv rows to replay (default: all).")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--images', type=int, default=20, help="Images from media/plant_disease_images.")
+    parser.add_argument('--requests', type=int, default=200, help="Prediction history requests.")
+    parser.add_argument('--history-rows', type=int, default=2000, help="History rows seeded for the history API.")
+    parser.add_argument('--warmup', type=int, default=3, help="Untimed operations before measuring.")
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    parser.add_argument('--baseline', help="JSON file from a previous --output run to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression, as a fraction.")
+    parser.add_argument('--child', choices=list(BENCHMARKS), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--media', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return measure(args.child, args)
+
+    results = run(args.only, args)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f), args.tolerance)
+        if failures:
+            print("Benchmark regressions:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Flat NumPy evaluator for the pickled crop classifier.
+
+``cropmodel2.pkl`` is a scikit-learn ``SVC`` (polynomial kernel, one-vs-one).
+``compile_model`` copies the fitted arrays out of the estimator, and
+``CompiledSVC.predict`` reproduces libsvm's pairwise voting with a couple of
+matrix products. No sklearn input validation runs, and loading a compiled
+``.npz`` does not import sklearn at all.
+"""
+import hashlib
+
+import numpy as np
+
+KERNELS = ('linear', 'poly', 'rbf', 'sigmoid')
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CompiledSVC:
+    """Array-backed one-vs-one SVC classifier."""
+
+    def __init__(self, kernel, gamma, coef0, degree, support_vectors, dual_coef,
+                 intercept, n_support, classes, source_hash=''):
+        if kernel not in KERNELS:
+            raise ValueError(f"Unsupported kernel {kernel!r}")
+        self.kernel = kernel
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=np.float64)
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.n_support = np.asarray(n_support, dtype=np.int64)
+        self.classes = np.asarray(classes)
+        self.source_hash = source_hash
+        self._build_pairs()
+
+    def _build_pairs(self):
+        # Column p of pair_weights holds the coefficients of the (i, j)
+        # classifier, in libsvm's pair order; all other rows are zero.
+        n_classes = len(self.classes)
+        starts = np.concatenate([[0], np.cumsum(self.n_support)])
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        weights = np.zeros((len(self.support_vectors), len(pairs)))
+        for p, (i, j) in enumerate(pairs):
+            rows_i = slice(starts[i], starts[i + 1])
+            rows_j = slice(starts[j], starts[j + 1])
+            weights[rows_i, p] = self.dual_coef[j - 1, rows_i]
+            weights[rows_j, p] = self.dual_coef[i, rows_j]
+        self.pair_weights = weights
+        self.pair_i = np.array([i for i, _ in pairs], dtype=np.int64)
+        self.pair_j = np.array([j for _, j in pairs], dtype=np.int64)
+
+    def _kernel(self, X):
+        if self.kernel == 'rbf':
+            sq = (
+                (X * X).sum(axis=1)[:, None]
+                - 2 * X @ self.support_vectors.T
+                + (self.support_vectors * self.support_vectors).sum(axis=1)[None, :]
+            )
+            return np.exp(-self.gamma * sq)
+        dot = X @ self.support_vectors.T
+        if self.kernel == 'linear':
+            return dot
+        if self.kernel == 'poly':
+            return (self.gamma * dot + self.coef0) ** self.degree
+        return np.tanh(self.gamma * dot + self.coef0)
+
+    def decision_pairs(self, X):
+        return self._kernel(X) @ self.pair_weights + self.intercept
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        winners = np.where(self.decision_pairs(X) > 0, self.pair_i, self.pair_j)
+        votes = np.zeros((len(X), len(self.classes)), dtype=np.int64)
+        np.add.at(votes, (np.arange(len(X))[:, None], winners), 1)
+        # Ties go to the lowest class index, as in libsvm
+        return self.classes[votes.argmax(axis=1)]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                kernel=np.array(self.kernel),
+                params=np.array([self.gamma, self.coef0, self.degree]),
+                support_vectors=self.support_vectors,
+                dual_coef=self.dual_coef,
+                intercept=self.intercept,
+                n_support=self.n_support,
+                classes=self.classes,
+                source_hash=np.array(self.source_hash),
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            gamma, coef0, degree = data['params']
+            return cls(
+                kernel=str(data['kernel']),
+                gamma=gamma,
+                coef0=coef0,
+                degree=degree,
+                support_vectors=data['support_vectors'],
+                dual_coef=data['dual_coef'],
+                intercept=data['intercept'],
+                n_support=data['n_support'],
+                classes=data['classes'],
+                source_hash=str(data['source_hash']),
+            )
+
+
+def compile_model(model, source_hash=''):
+    """Build a CompiledSVC from a fitted multi-class sklearn SVC."""
+    required = ('support_vectors_', 'dual_coef_', 'intercept_', 'n_support_', 'classes_', 'kernel')
+    if any(not hasattr(model, attr) for attr in required) or getattr(model, 'break_ties', False):
+        raise TypeError(f"Cannot compile {type(model).__name__}; only fitted SVC models are supported")
+    if not isinstance(model.kernel, str) or model.kernel not in KERNELS:
+        raise TypeError(f"Cannot compile SVC with kernel {model.kernel!r}")
+    if len(model.classes_) < 3:
+        # sklearn flips the sign of binary SVC coefficients; not needed here
+        raise TypeError("Only multi-class SVC models are supported")
+    return CompiledSVC(
+        kernel=model.kernel,
+        gamma=model._gamma,
+        coef0=model.coef0,
+        degree=model.degree,
+        support_vectors=model.support_vectors_,
+        dual_coef=model.dual_coef_,
+        intercept=model.intercept_,
+        n_support=model.n_support_,
+        classes=model.classes_,
+        source_hash=source_hash,
+    )
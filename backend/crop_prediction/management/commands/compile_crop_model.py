@@ -0,0 +1,44 @@
+import csv
+import os
+import pickle
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crop_prediction.compiled import compile_model, file_hash
+from crop_prediction.prediction import COMPILED_MODEL_PATH, CSV_COLUMNS, MODEL_PATH
+
+
+def load_csv_features(path):
+    with open(path, newline='') as f:
+        return np.array([[float(row[column]) for column in CSV_COLUMNS] for row in csv.DictReader(f)])
+
+
+class Command(BaseCommand):
+    help = "Compile cropmodel2.pkl into a flat NumPy evaluator (cropmodel2.npz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=COMPILED_MODEL_PATH)
+        parser.add_argument(
+            '--verify', default=os.path.join(settings.BASE_DIR.parent, 'crop_rec.csv'),
+            help="CSV whose rows must predict identically with both models ('' to skip)."
+        )
+
+    def handle(self, *args, **options):
+        with open(MODEL_PATH, 'rb') as f:
+            model = pickle.load(f)
+        try:
+            compiled = compile_model(model, source_hash=file_hash(MODEL_PATH))
+        except TypeError as exc:
+            raise CommandError(str(exc))
+
+        if options['verify']:
+            X = load_csv_features(options['verify'])
+            mismatches = int((compiled.predict(X) != model.predict(X)).sum())
+            if mismatches:
+                raise CommandError(f"Compiled model disagrees on {mismatches} of {len(X)} rows")
+            self.stdout.write(f"Verified {len(X)} rows against {MODEL_PATH}")
+
+        compiled.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,282 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from crop_prediction.prediction import CSV_COLUMNS, FEATURES, predict_crops, recommend_fertilizers
+
+OUTPUT_COLUMNS = ('predicted_crop', 'recommended_fertilizer')
+
+
+def _init_worker():
+    # Spawned (non-forked) workers start without Django configured
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def score_chunk(samples):
+    """Crops and fertilizers for rows ordered as ``FEATURES``; runs in a worker."""
+    crops = predict_crops(samples, use_cache=False)
+    return crops, recommend_fertilizers(samples, crops)
+
+
+class Checkpoint:
+    """Progress of one scoring run, stored next to the output as JSON.
+
+    It is written (atomically) after a chunk's output is flushed, and with
+    --save-history inside the transaction that inserts the chunk's rows, so
+    a resumed run starts at the first chunk that was not finished. It keeps
+    the state before the last chunk and that chunk's last history row, in
+    case the run stopped after the write but before the commit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {'chunks': 0, 'rows': 0, 'invalid': 0, 'output_bytes': 0}
+
+    def load(self, options):
+        with open(self.path) as f:
+            state = json.load(f)
+        for key in ('input', 'chunk_size'):
+            if state.get(key) != options[key]:
+                raise CommandError(f"Cannot resume: {key} differs from the interrupted run ({state.get(key)!r})")
+        self.state.update(state)
+
+    def save(self, options, **progress):
+        previous = {key: value for key, value in self.state.items() if key != 'previous'}
+        self.state.update(progress, previous=previous, input=options['input'], chunk_size=options['chunk_size'])
+        partial = f"{self.path}.tmp"
+        with open(partial, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(partial, self.path)
+
+    def rollback(self):
+        """Forget the last chunk, whose history rows were never committed."""
+        self.state = self.state['previous']
+
+
+class CsvSink:
+    def __init__(self, path, header, resume_at):
+        exists = os.path.exists(path)
+        if resume_at and not exists:
+            raise CommandError(f"Cannot resume: {path} is missing")
+        self.file = open(path, 'r+' if exists else 'w', newline='')
+        if resume_at:
+            # Drop anything written after the last checkpoint
+            self.file.truncate(resume_at)
+            self.file.seek(resume_at)
+        else:
+            self.file.truncate(0)
+            csv.writer(self.file).writerow(header)
+        self.writer = csv.writer(self.file)
+
+    def write(self, index, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """One ``part-NNNNNN.parquet`` file per chunk in an output directory."""
+
+    def __init__(self, path, header, resume_at):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise CommandError("Parquet output needs the pyarrow package installed")
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path = path
+        self.header = header
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, index, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in self.header]
+        table = self.pa.table({name: list(values) for name, values in zip(self.header, columns)})
+        part = os.path.join(self.path, f'part-{index:06d}.parquet')
+        self.pq.write_table(table, f'{part}.tmp', compression='zstd')
+        os.replace(f'{part}.tmp', part)
+        return 0
+
+    def close(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Score a soil CSV in the crop_rec.csv schema (N,P,K,temperature,humidity,ph,rainfall) "
+        "in chunks across a process pool, writing crops and fertilizers to CSV or Parquet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV with at least the N,P,K,temperature,humidity,ph,rainfall columns.")
+        parser.add_argument('output', help="Output .csv file, or directory of Parquet parts with --format parquet.")
+        parser.add_argument('--format', choices=['csv', 'parquet'],
+                            help="Default: parquet if OUTPUT ends in .parquet, otherwise csv.")
+        parser.add_argument('--chunk-size', type=int, default=50_000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--save-history', metavar='USERNAME',
+                            help="Also bulk-insert the predictions as CropRecommendation rows for this user.")
+        parser.add_argument('--resume', action='store_true',
+                            help="Continue an interrupted run from OUTPUT.progress.json.")
+
+    def handle(self, *args, **options):
+        options['input'] = os.path.abspath(options['input'])
+        output_format = options['format'] or ('parquet' if options['output'].endswith('.parquet') else 'csv')
+        user = self._history_user(options['save_history'])
+
+        checkpoint = Checkpoint(f"{options['output'].rstrip(os.sep)}.progress.json")
+        if options['resume']:
+            if not os.path.exists(checkpoint.path):
+                raise CommandError(f"No checkpoint at {checkpoint.path}; nothing to resume")
+            checkpoint.load(options)
+            if user is not None and not self._history_committed(user, checkpoint.state.get('history_id')):
+                checkpoint.rollback()
+        elif os.path.exists(checkpoint.path):
+            raise CommandError(f"{checkpoint.path} exists; pass --resume or remove it")
+
+        with open(options['input'], 'rb') as source:
+            header, line_reader = self._reader(source)
+            output_header = header + list(OUTPUT_COLUMNS)
+            sink_class = ParquetSink if output_format == 'parquet' else CsvSink
+            sink = sink_class(options['output'], output_header, checkpoint.state['output_bytes'])
+            try:
+                self._run(options, source, header, line_reader, sink, checkpoint, user)
+            finally:
+                sink.close()
+        os.remove(checkpoint.path)
+
+    def _history_user(self, username):
+        if not username:
+            return None
+        from users.models import User
+
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {username!r}")
+
+    def _history_committed(self, user, history_id):
+        from api.models import CropRecommendation
+
+        return history_id is None or CropRecommendation.objects.filter(pk=history_id, user=user).exists()
+
+    def _reader(self, source):
+        lines = (line.decode('utf-8-sig') for line in source)
+        reader = csv.reader(lines)
+        try:
+            header = next(reader)
+        except StopIteration:
+            raise CommandError("Input CSV is empty")
+        missing = [column for column in CSV_COLUMNS if column not in header]
+        if missing:
+            raise CommandError(f"Input CSV is missing columns: {', '.join(missing)}")
+        return header, reader
+
+    def _chunks(self, header, reader, chunk_size, skip):
+        """Yield (index, rows, samples, valid_positions), reading one chunk at a time."""
+        positions = [header.index(column) for column in CSV_COLUMNS]
+        index = 0
+        while True:
+            rows = []
+            for row in reader:
+                rows.append(row)
+                if len(rows) == chunk_size:
+                    break
+            if not rows:
+                return
+            if index >= skip:
+                samples, valid = [], []
+                for i, row in enumerate(rows):
+                    try:
+                        samples.append([float(row[p]) for p in positions])
+                    except (ValueError, IndexError):
+                        continue
+                    valid.append(i)
+                yield index, rows, samples, valid
+            index += 1
+
+    def _run(self, options, source, header, reader, sink, checkpoint, user):
+        state = checkpoint.state
+        done_rows, invalid = state['rows'], state['invalid']
+        if state['chunks']:
+            self.stdout.write(f"Resuming after {state['chunks']} chunks ({done_rows} rows)")
+        total_bytes = os.fstat(source.fileno()).st_size
+        started = time.monotonic()
+        scored_now = 0
+
+        chunks = self._chunks(header, reader, options['chunk_size'], skip=state['chunks'])
+        # At most two chunks per worker are in memory at any time
+        window = deque()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            while True:
+                while len(window) < 2 * options['workers']:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    index, rows, samples, valid = chunk
+                    window.append((index, rows, samples, valid, pool.submit(score_chunk, samples)))
+                if not window:
+                    break
+
+                index, rows, samples, valid, future = window.popleft()
+                crops, fertilizers = future.result()
+                results = {i: (crop, fertilizer) for i, crop, fertilizer in zip(valid, crops, fertilizers)}
+                output_rows = [row + list(results.get(i, ('', ''))) for i, row in enumerate(rows)]
+                output_bytes = sink.write(index, output_rows)
+
+                done_rows += len(rows)
+                invalid += len(rows) - len(valid)
+                scored_now += len(rows)
+                progress = dict(chunks=index + 1, rows=done_rows, invalid=invalid, output_bytes=output_bytes)
+                if user is None:
+                    checkpoint.save(options, **progress)
+                else:
+                    # The checkpoint only counts once the rows commit; see Checkpoint
+                    with transaction.atomic():
+                        history_id = self._save_history(user, samples, crops, fertilizers)
+                        checkpoint.save(options, history_id=history_id, **progress)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"chunk {index + 1}: {done_rows} rows ({source.tell() / total_bytes:.0%} of input), "
+                    f"{scored_now / elapsed if elapsed else 0:.0f} rows/s, {invalid} invalid"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {done_rows} rows into {options['output']} ({invalid} invalid rows left blank)"
+        ))
+
+    def _save_history(self, user, samples, crops, fertilizers):
+        """Insert the chunk's CropRecommendation rows; returns the last one's pk, if any."""
+        from api import rollups
+        from api.models import CropRecommendation
+
+        region = rollups.region_of(user)
+        recommendations = CropRecommendation.objects.bulk_create(
+            [
+                CropRecommendation(
+                    user=user,
+                    region=region,
+                    predicted_crop=crop,
+                    recommended_fertilizer=fertilizer,
+                    **dict(zip(FEATURES, sample))
+                )
+                for sample, crop, fertilizer in zip(samples, crops, fertilizers)
+            ],
+            batch_size=1000,
+        )
+        rollups.record_predictions(recommendations)
+        return recommendations[-1].pk if recommendations else None
@@ -1,32 +1,159 @@
 import pickle
+import logging
 import os
+import threading
 import numpy as np
 from django.conf import settings
 
-# Load the model (assuming you have saved your trained model as a pickle file)
+from farm_help_project.metrics import record_model_load, register_gauges, span
+
+from .cache import MISSING, PredictionCache
+from .compiled import CompiledSVC, file_hash
+
+logger = logging.getLogger(__name__)
+
 MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'cropmodel2.pkl')
-with open(MODEL_PATH, 'rb') as f:
-    crop_model = pickle.load(f)
+# Output of `manage.py compile_crop_model`; used instead of the pickle when
+# it was compiled from the current cropmodel2.pkl
+COMPILED_MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'cropmodel2.npz')
 
-def predict_crop(n, p, k, ph, rainfall, humidity, temperature):
-    """
-    Predict crop based on soil and climate parameters
-    """
+# Column order the model was trained on (crop_rec.csv's)
+FEATURES = ('nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall')
+# The same columns as named in crop_rec.csv-style datasets
+CSV_COLUMNS = ('N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall')
+
+prediction_cache = PredictionCache(
+    maxsize=getattr(settings, 'CROP_PREDICTION_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'CROP_PREDICTION_CACHE_TTL', 3600),
+)
+register_gauges('crop_prediction_cache', prediction_cache.stats)
+
+# Optional rounding step per feature, e.g. {'rainfall': 1.0}; inputs are
+# snapped to the grid before prediction so near-identical samples share a
+# cache entry
+_quantization = getattr(settings, 'CROP_PREDICTION_CACHE_QUANTIZATION', {})
+QUANTIZATION_STEPS = np.array([_quantization.get(feature, 0) for feature in FEATURES], dtype=float)
+
+crop_model = None
+_model_signature = None
+_model_lock = threading.Lock()
 
-    mapper = {
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_model():
+    if getattr(settings, 'CROP_MODEL_USE_COMPILED', True) and os.path.exists(COMPILED_MODEL_PATH):
+        compiled = CompiledSVC.load(COMPILED_MODEL_PATH)
+        if compiled.source_hash == file_hash(MODEL_PATH):
+            return compiled
+        logger.warning(
+            "%s was not compiled from the current %s; run `manage.py compile_crop_model`",
+            COMPILED_MODEL_PATH, MODEL_PATH
+        )
+    with open(MODEL_PATH, 'rb') as f:
+        return pickle.load(f)
+
+
+def _current_model():
+    """Return the crop model and its file signature, loading it on first use and
+    reloading it if a model file changed."""
+    global crop_model, _model_signature
+    signature = (_file_signature(MODEL_PATH), _file_signature(COMPILED_MODEL_PATH))
+    if signature != _model_signature:
+        with _model_lock:
+            if signature != _model_signature:
+                try:
+                    model = _load_model()
+                except Exception:
+                    record_model_load('crop', 'error')
+                    raise
+                record_model_load('crop', 'loaded')
+                if _model_signature is not None:
+                    prediction_cache.clear()
+                crop_model, _model_signature = model, signature
+    return crop_model, _model_signature
+
+
+CROP_LABELS = {
     1: 'rice', 2: 'maize', 3: 'chickpea', 4: 'kidneybeans', 5: 'pigeonpeas',
     6: 'mothbeans', 7: 'mungbean', 8: 'blackgram', 9: 'lentil', 10: 'pomegranate',
     11: 'banana', 12: 'mango', 13: 'grapes', 14: 'watermelon', 15: 'muskmelon',
     16: 'apple', 17: 'orange', 18: 'papaya', 19: 'coconut', 20: 'cotton',
     21: 'jute', 22: 'coffee'
-    }
+}
 
-    # Create input array for prediction
-    input_data = np.array([[n, p, k, ph, rainfall, humidity, temperature]])
-    
-    # Make prediction
-    crop = crop_model.predict(input_data)[0]
-    return mapper.get(crop, 'Unknown')
+# This is a simplified version - you would likely have more complex logic
+FERTILIZER_MAP = {
+    'rice': {
+        'low_n': 'Urea',
+        'low_p': 'Single Superphosphate',
+        'low_k': 'Muriate of Potash',
+        'balanced': 'NPK 10-26-26'
+    },
+    'wheat': {
+        'low_n': 'Ammonium Sulfate',
+        'low_p': 'Diammonium Phosphate',
+        'low_k': 'Sulfate of Potash',
+        'balanced': 'NPK 12-32-16'
+    },
+    # Add more crops and fertilizer recommendations
+}
+
+DEFAULT_FERTILIZER = "General purpose NPK fertilizer recommended. Consult local agricultural extension for specific advice."
+
+
+def predict_crop(n, p, k, ph, rainfall, humidity, temperature):
+    """
+    Predict crop based on soil and climate parameters
+    """
+    return predict_crops([[n, p, k, temperature, humidity, ph, rainfall]])[0]
+
+
+def quantize(input_data):
+    """Snap rows to the configured per-feature grid."""
+    steps = QUANTIZATION_STEPS
+    if not steps.any():
+        return input_data
+    snapped = steps > 0
+    input_data = input_data.copy()
+    input_data[:, snapped] = np.round(input_data[:, snapped] / steps[snapped]) * steps[snapped]
+    return input_data
+
+
+def predict_crops(samples, use_cache=True):
+    """
+    Predict crops for many samples with a single model call.
+
+    ``samples`` is an N x 7 array-like of rows ordered as ``FEATURES``.
+    Returns a list of crop names in input order. Rows already in the
+    prediction cache are answered without touching the model; bulk jobs that
+    would only churn the cache can pass ``use_cache=False``.
+    """
+    input_data = quantize(np.asarray(samples, dtype=float).reshape(-1, len(FEATURES)))
+    if not len(input_data):
+        return []
+
+    model, signature = _current_model()
+    if not use_cache:
+        with span('crop_model'):
+            labels = model.predict(input_data)
+        return [CROP_LABELS.get(label, 'Unknown') for label in labels]
+    keys = [(signature, *row) for row in input_data.tolist()]
+    crops = [prediction_cache.get(key) for key in keys]
+    missing = [i for i, crop in enumerate(crops) if crop is MISSING]
+    if missing:
+        with span('crop_model'):
+            labels = model.predict(input_data[missing])
+        for i, label in zip(missing, labels):
+            crops[i] = CROP_LABELS.get(label, 'Unknown')
+            prediction_cache.set(keys[i], crops[i])
+    return crops
 
 
 
@@ -34,33 +161,26 @@ def recommend_fertilizer(n, p, k, crop):
     """
     Recommend fertilizer based on NPK values and predicted crop
     """
-    # This is a simplified version - you would likely have more complex logic
-    fertilizer_map = {
-        'rice': {
-            'low_n': 'Urea',
-            'low_p': 'Single Superphosphate',
-            'low_k': 'Muriate of Potash',
-            'balanced': 'NPK 10-26-26'
-        },
-        'wheat': {
-            'low_n': 'Ammonium Sulfate',
-            'low_p': 'Diammonium Phosphate',
-            'low_k': 'Sulfate of Potash',
-            'balanced': 'NPK 12-32-16'
-        },
-        # Add more crops and fertilizer recommendations
-    }
-    
     # Default to a generic fertilizer if crop isn't in our map
-    if crop not in fertilizer_map:
-        return "General purpose NPK fertilizer recommended. Consult local agricultural extension for specific advice."
-    
+    if crop not in FERTILIZER_MAP:
+        return DEFAULT_FERTILIZER
+
     # Check NPK levels and make recommendation
     if n < 30:
-        return fertilizer_map[crop]['low_n']
+        return FERTILIZER_MAP[crop]['low_n']
     elif p < 30:
-        return fertilizer_map[crop]['low_p']
+        return FERTILIZER_MAP[crop]['low_p']
     elif k < 30:
-        return fertilizer_map[crop]['low_k']
+        return FERTILIZER_MAP[crop]['low_k']
     else:
-        return fertilizer_map[crop]['balanced']
\ No newline at end of file
+        return FERTILIZER_MAP[crop]['balanced']
+
+
+def recommend_fertilizers(samples, crops):
+    """
+    Recommend fertilizers for rows of ``FEATURES`` and their predicted crops
+    """
+    return [
+        recommend_fertilizer(row[0], row[1], row[2], crop)
+        for row, crop in zip(samples, crops)
+    ]
@@ -1,3 +1,123 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import pickle
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from .compiled import CompiledSVC, compile_model, file_hash
+from .management.commands.compile_crop_model import load_csv_features
+from .management.commands.score_soil_csv import Checkpoint
+from .prediction import COMPILED_MODEL_PATH, CROP_LABELS, MODEL_PATH, predict_crop, predict_crops
+
+CROP_REC_CSV = os.path.join(settings.BASE_DIR.parent, 'crop_rec.csv')
+
+
+class CompiledCropModelTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(MODEL_PATH, 'rb') as f:
+            cls.model = pickle.load(f)
+        cls.X = load_csv_features(CROP_REC_CSV)
+
+    def test_matches_sklearn_on_crop_rec(self):
+        compiled = compile_model(self.model)
+        self.assertEqual(list(compiled.predict(self.X)), list(self.model.predict(self.X)))
+
+    def test_single_row(self):
+        compiled = compile_model(self.model)
+        for row in self.X[:50]:
+            self.assertEqual(compiled.predict(row)[0], self.model.predict(row.reshape(1, -1))[0])
+
+    def test_predict_crop_uses_training_column_order(self):
+        with open(CROP_REC_CSV, newline='') as f:
+            row = {column: float(value) for column, value in next(csv.DictReader(f)).items() if column != 'label'}
+        crop = predict_crop(
+            n=row['N'], p=row['P'], k=row['K'], ph=row['ph'], rainfall=row['rainfall'],
+            humidity=row['humidity'], temperature=row['temperature'],
+        )
+        self.assertEqual(crop, CROP_LABELS.get(self.model.predict(self.X[:1])[0], 'Unknown'))
+
+    def test_shipped_artifact_is_current(self):
+        compiled = CompiledSVC.load(COMPILED_MODEL_PATH)
+        self.assertEqual(compiled.source_hash, file_hash(MODEL_PATH))
+        self.assertEqual(list(compiled.predict(self.X)), list(self.model.predict(self.X)))
+
+
+class ScoreSoilCsvTests(SimpleTestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+        self.output = os.path.join(self.scratch.name, 'scored.csv')
+        self.X = load_csv_features(CROP_REC_CSV)[:250]
+
+    def score(self, *args):
+        call_command(
+            'score_soil_csv', CROP_REC_CSV, self.output, '--chunk-size', '100', '--workers', '1', *args,
+            stdout=io.StringIO()
+        )
+        with open(self.output, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_matches_predict_crops(self):
+        rows = self.score()[:len(self.X)]
+        self.assertEqual([row['predicted_crop'] for row in rows], predict_crops(self.X))
+        self.assertFalse(os.path.exists(f'{self.output}.progress.json'))
+
+    def test_resume_after_interruption(self):
+        expected = self.score()
+        # Leave the state an interrupted run would: two chunks checkpointed,
+        # plus a partly written third chunk after the checkpointed offset
+        with open(self.output, newline='') as f:
+            lines = f.readlines()
+        with open(self.output, 'w', newline='') as f:
+            f.writelines(lines[:201])
+            offset = f.tell()
+            f.writelines(lines[201:230])
+        with open(f'{self.output}.progress.json', 'w') as f:
+            json.dump({'chunks': 2, 'rows': 200, 'invalid': 0, 'output_bytes': offset,
+                       'input': CROP_REC_CSV, 'chunk_size': 100}, f)
+
+        self.assertEqual(self.score('--resume'), expected)
+
+
+class ScoreSoilCsvHistoryTests(TestCase):
+    def setUp(self):
+        from users.models import User
+
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.output = os.path.join(scratch.name, 'scored.csv')
+        self.user = User.objects.create_user('farmer', password='password')
+
+    def score(self, *args):
+        call_command(
+            'score_soil_csv', CROP_REC_CSV, self.output, '--chunk-size', '500', '--workers', '1',
+            '--save-history', 'farmer', *args, stdout=io.StringIO()
+        )
+
+    def test_resume_after_crash_between_checkpoint_and_commit(self):
+        from api.models import CropRecommendation, CropRollup
+
+        save = Checkpoint.save
+
+        def save_then_crash(checkpoint, options, **progress):
+            save(checkpoint, options, **progress)
+            if progress['chunks'] == 2:
+                raise RuntimeError("killed before commit")
+
+        with mock.patch.object(Checkpoint, 'save', save_then_crash), self.assertRaises(RuntimeError):
+            self.score()
+        self.assertEqual(CropRecommendation.objects.filter(user=self.user).count(), 500)
+
+        self.score('--resume')
+        with open(self.output, newline='') as f:
+            scored = len(list(csv.DictReader(f)))
+        self.assertEqual(CropRecommendation.objects.filter(user=self.user).count(), scored)
+        self.assertEqual(sum(CropRollup.objects.values_list('predictions', flat=True)), scored)
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "farm_help_project.settings")
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.PLANT_DISEASE_PRELOAD_MODEL:
+    from pest_recognition.inference import registry
+    registry.preload()
@@ -0,0 +1,166 @@
+"""
+In-process request metrics: per-stage timing spans, histograms and counters.
+
+Code marks a stage with ``with span('decode'):``. While a request is being
+handled by ``ServerTimingMiddleware``, each finished span is added to that
+response's ``Server-Timing`` header. Every span is also recorded in the
+``stage_seconds`` histogram. ``render_prometheus`` writes everything in the
+Prometheus text format for the /metrics endpoint.
+
+All of this is off unless REQUEST_METRICS is set. When it is off, ``span``
+returns a shared no-op context manager and the middleware removes itself.
+Metrics are per process; with several workers, scrape each one.
+"""
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+
+ENABLED = getattr(settings, 'REQUEST_METRICS', False)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request = threading.local()
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}'
+            yield f'{self.name}_bucket{{{labels},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{labels}}} {total}"
+            yield f"{self.name}_count{{{labels}}} {count}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{{{_labels(self.labels, label_values)}}} {value}"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+stage_seconds = Histogram('farm_help_stage_seconds', "Time spent in each request stage.", ('stage',))
+request_seconds = Histogram(
+    'farm_help_request_seconds', "Request latency by route.", ('route', 'method')
+)
+requests_total = Counter(
+    'farm_help_requests_total', "Requests handled, by route, method and status.", ('route', 'method', 'status')
+)
+model_loads_total = Counter(
+    'farm_help_model_loads_total', "Model load attempts, by model and outcome.", ('model', 'outcome')
+)
+
+# Callables returning {name: number}, rendered as gauges at scrape time
+_gauge_sources = {}
+
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.started
+        stage_seconds.observe((self.name,), duration)
+        spans = getattr(_request, 'spans', None)
+        if spans is not None:
+            spans.append((self.name, duration))
+        return False
+
+
+def span(name):
+    """Time a stage of the current request."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+def record_model_load(model, outcome):
+    if ENABLED:
+        model_loads_total.inc((model, outcome))
+
+
+def register_gauges(prefix, source):
+    """Expose ``source()``'s numeric values as ``<prefix>_<key>`` gauges."""
+    _gauge_sources[prefix] = source
+
+
+def start_request():
+    _request.spans = []
+
+
+def finish_request():
+    spans = getattr(_request, 'spans', None) or []
+    _request.spans = None
+    return spans
+
+
+def render_prometheus():
+    lines = []
+    for metric in (requests_total, request_seconds, stage_seconds, model_loads_total):
+        lines.extend(metric.render())
+    for prefix, source in sorted(_gauge_sources.items()):
+        for key, value in sorted(source().items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"farm_help_{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
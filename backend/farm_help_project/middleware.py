@@ -0,0 +1,40 @@
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """Adds a ``Server-Timing`` header with the request's stage spans and
+    records request counts and latency. Removes itself unless REQUEST_METRICS
+    is on."""
+
+    def __init__(self, get_response):
+        if not metrics.ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            spans = metrics.finish_request()
+        total = time.perf_counter() - started
+
+        # The URL pattern, not the path, keeps label cardinality bounded
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        metrics.request_seconds.observe((route, request.method), total)
+        metrics.requests_total.inc((route, request.method, str(response.status_code)))
+
+        durations = {}
+        for name, duration in spans:
+            durations[name] = durations.get(name, 0.0) + duration
+        durations['total'] = total
+        response['Server-Timing'] = ", ".join(
+            f"{name};dur={duration * 1000:.1f}" for name, duration in durations.items()
+        )
+        return response
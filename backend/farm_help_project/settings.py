@@ -27,11 +27,17 @@ ALLOWED_HOSTS = [".vercel.app"]
 # Configure REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.JWTAuthentication',
     ),
     
 }
 
+# Authenticated users are cached per token subject for this many seconds
+# (0 disables). The default cache is per process, so with several workers a
+# user change reaches the others only after the TTL unless CACHES points at a
+# shared backend.
+JWT_USER_CACHE_TTL = 30
+
 
 
 
@@ -58,6 +64,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "farm_help_project.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -106,6 +113,34 @@ DATABASES = {
     }
 }
 
+# SQLite concurrency profile: WAL lets readers run alongside the single
+# writer, writers wait up to "timeout" seconds for the lock instead of failing
+# with "database is locked", and IMMEDIATE transactions take the write lock up
+# front so they cannot deadlock upgrading from a read lock. Disable with
+# SQLITE_CONCURRENT=0, e.g. where the database file is read-only.
+SQLITE_CONCURRENT = os.environ.get(
+    'SQLITE_CONCURRENT', '0' if os.environ.get('VERCEL') else '1'
+) == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable across application crashes; only an OS crash can lose the last commits
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # KiB
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+SQLITE_CONCURRENT_OPTIONS = {
+    "timeout": 20,
+    "transaction_mode": "IMMEDIATE",
+    "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+}
+
+if SQLITE_CONCURRENT:
+    DATABASES["default"]["OPTIONS"] = SQLITE_CONCURRENT_OPTIONS
+    # Keep connections (and their pragmas and page cache) between requests
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -147,6 +182,79 @@ STATIC_URL = "static/"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Crop prediction
+# Upper bound on samples accepted by /api/predict-crop/batch/ in one request.
+CROP_PREDICTION_MAX_BATCH_SIZE = 1000
+# In-memory LRU cache of predictions keyed on the input vector. Entries expire
+# after CROP_PREDICTION_CACHE_TTL seconds and are dropped whenever
+# cropmodel2.pkl changes. A size of 0 disables the cache.
+CROP_PREDICTION_CACHE_SIZE = 4096
+CROP_PREDICTION_CACHE_TTL = 3600
+# Optional per-feature rounding step, e.g. {'rainfall': 1.0, 'humidity': 0.5}
+CROP_PREDICTION_CACHE_QUANTIZATION = {}
+# Default page size of /api/prediction-history/ (clients may ask for up to 500)
+PREDICTION_HISTORY_PAGE_SIZE = 50
+# Rows fetched per query, and written per response chunk, by the streaming
+# /api/export/predictions.csv and /api/export/detections.csv downloads
+HISTORY_EXPORT_CHUNK_SIZE = 2000
+
+# Plant disease detection
+# Load and warm up the YOLO weights when the WSGI/ASGI application starts,
+# so the first upload does not pay for it. Off on Vercel, where cold starts
+# should only pay for what the request uses.
+PLANT_DISEASE_PRELOAD_MODEL = os.environ.get(
+    'PLANT_DISEASE_PRELOAD_MODEL', '0' if os.environ.get('VERCEL') else '1'
+) == '1'
+# Detection engine: 'ultralytics' runs ml_models/best.pt through PyTorch;
+# 'opencv' and 'onnxruntime' run ml_models/best.onnx (see
+# `manage.py export_disease_model`) without torch. With
+# PLANT_DISEASE_QUANTIZED the ONNX backends load the INT8 model written by
+# `manage.py quantize_disease_model` (best.int8.onnx) instead; 'onnxruntime'
+# is the backend that supports it. PLANT_DISEASE_WEIGHTS overrides the file.
+PLANT_DISEASE_BACKEND = os.environ.get('PLANT_DISEASE_BACKEND', 'ultralytics')
+PLANT_DISEASE_QUANTIZED = os.environ.get('PLANT_DISEASE_QUANTIZED', '0') == '1'
+PLANT_DISEASE_WEIGHTS = os.environ.get('PLANT_DISEASE_WEIGHTS') or None
+# Uploads are decoded and shrunk so the longer side is at most this many
+# pixels before inference, rendering and encoding.
+PLANT_DISEASE_MAX_IMAGE_SIDE = 1280
+# Tiled inference for large photos with small lesions: images whose longer
+# side exceeds PLANT_DISEASE_TILE_MIN_SIDE are capped at
+# PLANT_DISEASE_TILED_MAX_SIDE and run as overlapping tiles whose boxes are
+# merged with cross-tile NMS.
+PLANT_DISEASE_TILED = False
+PLANT_DISEASE_TILE_SIZE = 640
+PLANT_DISEASE_TILE_OVERLAP = 0.2
+PLANT_DISEASE_TILE_MIN_SIDE = 2000
+PLANT_DISEASE_TILED_MAX_SIDE = 4096
+# Group concurrent uploads into one batched forward pass. A batch is flushed
+# after PLANT_DISEASE_BATCH_MAX_WAIT_MS or once it holds
+# PLANT_DISEASE_BATCH_MAX_SIZE images.
+PLANT_DISEASE_BATCHING = False
+PLANT_DISEASE_BATCH_MAX_SIZE = 8
+PLANT_DISEASE_BATCH_MAX_WAIT_MS = 10
+# Return 202 with a job id and let `manage.py run_detection_workers` process
+# uploads. Clients can also opt in per request with ?async=1.
+PLANT_DISEASE_ASYNC = False
+PLANT_DISEASE_JOB_LEASE_SECONDS = 300
+PLANT_DISEASE_JOB_MAX_ATTEMPTS = 3
+# Annotated results and list-view thumbnails are stored in this format
+# ('webp' or 'jpeg') and quality. Thumbnails are at most
+# PLANT_DISEASE_THUMBNAIL_SIDE pixels on their longer side.
+PLANT_DISEASE_IMAGE_FORMAT = 'webp'
+PLANT_DISEASE_IMAGE_QUALITY = 80
+PLANT_DISEASE_THUMBNAIL_SIDE = 320
+# Field scans (POST /api/plant-disease/scan/): many images or one zip archive,
+# run through the model PLANT_DISEASE_BATCH_MAX_SIZE images at a time.
+PLANT_DISEASE_SCAN_MAX_IMAGES = 500
+PLANT_DISEASE_SCAN_MAX_IMAGE_BYTES = 20 * 1024 * 1024
+DATA_UPLOAD_MAX_NUMBER_FILES = PLANT_DISEASE_SCAN_MAX_IMAGES
+
+# Request metrics: Server-Timing headers and a Prometheus /metrics endpoint
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', '0') == '1'
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token only
+# logged-in staff can read /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -159,4 +267,3 @@ AUTH_USER_MODEL = 'users.User'
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',  # Default auth backend
 ]
-
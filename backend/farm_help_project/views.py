@@ -0,0 +1,21 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from . import metrics
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for this process, for METRICS_TOKEN holders and staff."""
+    if not metrics.ENABLED:
+        raise Http404
+    if not (_has_metrics_token(request) or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _has_metrics_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
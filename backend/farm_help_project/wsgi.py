@@ -15,4 +15,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "farm_help_project.settings")
 
 application = get_wsgi_application()
 
+from django.conf import settings  # noqa: E402
+
+if settings.PLANT_DISEASE_PRELOAD_MODEL:
+    from pest_recognition.inference import registry
+    registry.preload()
+
 app = application
@@ -0,0 +1,285 @@
+"""
+Interchangeable engines for the plant disease detector.
+
+Every backend loads its weights once, returns ``Detections`` in original image
+pixel coordinates, and can render them onto the image. Heavy libraries are
+imported inside ``load`` so that choosing a backend costs nothing until it is
+used.
+"""
+import json
+import os
+
+import numpy as np
+
+WARMUP_SHAPE = (640, 640, 3)
+
+
+class Detections:
+    """Boxes found in one image: ``boxes`` is N x 4 (x1, y1, x2, y2) in pixels."""
+
+    __slots__ = ('boxes', 'scores', 'class_ids', 'raw')
+
+    def __init__(self, boxes, scores, class_ids, raw=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        # Backend-native result, if the backend can render it better itself
+        self.raw = raw
+
+    def __len__(self):
+        return len(self.class_ids)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+    def scaled(self, factor):
+        """The same boxes in an image resized by ``factor``."""
+        if factor == 1:
+            return self
+        return Detections(self.boxes * factor, self.scores, self.class_ids)
+
+
+class InferenceBackend:
+    name = None
+
+    def __init__(self, path, conf=0.4, iou=0.7, imgsz=640):
+        self.path = path
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.names = {}
+
+    def load(self):
+        """Load the weights and run a warm-up pass; returns self."""
+        raise NotImplementedError
+
+    def predict(self, images):
+        """Return one ``Detections`` per image, in order."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        self.predict([np.zeros(WARMUP_SHAPE, dtype=np.uint8)])
+
+    def render(self, image, detections):
+        return draw_detections(image, detections, self.names)
+
+
+class UltralyticsBackend(InferenceBackend):
+    """The original PyTorch ``best.pt`` path through ultralytics."""
+
+    name = 'ultralytics'
+
+    def load(self):
+        # Imported here so that importing this module does not pull in torch
+        from ultralytics import YOLO
+
+        self.model = YOLO(self.path)
+        self.names = self.model.names
+        self.warm_up()
+        return self
+
+    def predict(self, images):
+        results = self.model(list(images), conf=self.conf, iou=self.iou, verbose=False)
+        return [
+            Detections(
+                r.boxes.xyxy.cpu().numpy(),
+                r.boxes.conf.cpu().numpy(),
+                r.boxes.cls.cpu().numpy(),
+                raw=r,
+            )
+            for r in results
+        ]
+
+    def render(self, image, detections):
+        if detections.raw is not None:
+            return detections.raw.plot()
+        return super().render(image, detections)
+
+
+class YoloOnnxBackend(InferenceBackend):
+    """Shared pre/post-processing for an exported YOLO ONNX graph.
+
+    Needs ``<weights>.onnx`` plus the ``<weights>.onnx.json`` sidecar written by
+    ``manage.py export_disease_model`` (class names and input size).
+    """
+
+    def load(self):
+        with open(metadata_path(self.path)) as f:
+            metadata = json.load(f)
+        self.names = {int(k): v for k, v in metadata['names'].items()}
+        self.imgsz = int(metadata.get('imgsz', self.imgsz))
+        self._load_graph()
+        self.warm_up()
+        return self
+
+    def _load_graph(self):
+        raise NotImplementedError
+
+    def _forward(self, blob):
+        raise NotImplementedError
+
+    def predict(self, images):
+        import cv2
+
+        detections = []
+        for image in images:
+            padded, ratio, (left, top) = letterbox(image, self.imgsz)
+            blob = cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)
+            output = self._forward(blob)
+            detections.append(self._postprocess(output[0], ratio, left, top, image.shape))
+        return detections
+
+    def _postprocess(self, output, ratio, left, top, shape):
+        # YOLOv8 head: (4 + num_classes) x anchors, boxes as cx, cy, w, h
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores > self.conf
+        if not keep.any():
+            return Detections.empty()
+        cx, cy, w, h = predictions[keep, :4].T
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        scores, class_ids = scores[keep], class_ids[keep]
+
+        kept = nms(boxes, scores, class_ids, self.iou)
+        boxes, scores, class_ids = boxes[kept], scores[kept], class_ids[kept]
+
+        boxes -= np.array([left, top, left, top], dtype=boxes.dtype)
+        boxes /= ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+        return Detections(boxes, scores, class_ids)
+
+
+class OpenCVDNNBackend(YoloOnnxBackend):
+    """Runs the ONNX graph through ``cv2.dnn``; no torch, no extra dependency."""
+
+    name = 'opencv'
+
+    def _load_graph(self):
+        import cv2
+
+        self.net = cv2.dnn.readNetFromONNX(self.path)
+
+    def _forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward()
+
+
+class OnnxRuntimeBackend(YoloOnnxBackend):
+    """Runs the ONNX graph through onnxruntime, which also executes INT8 models
+    produced by ``manage.py quantize_disease_model``. Requires ``onnxruntime``.
+    """
+
+    name = 'onnxruntime'
+
+    def _load_graph(self):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The 'onnxruntime' backend needs the onnxruntime package installed")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            self.path, options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OpenCVDNNBackend.name: OpenCVDNNBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+}
+
+
+def metadata_path(onnx_path):
+    return f"{onnx_path}.json"
+
+
+def letterbox(image, size, color=(114, 114, 114)):
+    """Resize keeping aspect ratio and pad to ``size`` x ``size``, as ultralytics does."""
+    import cv2
+
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    dw, dh = (size - new_width) / 2, (size - new_height) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, ratio, (left, top)
+
+
+def nms(boxes, scores, class_ids, iou_threshold, max_det=300):
+    """Greedy per-class non-maximum suppression; returns kept indices by score."""
+    # Offset boxes by class so that boxes of different classes never overlap
+    offsets = class_ids[:, None].astype(boxes.dtype) * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def draw_detections(image, detections, names):
+    """Draw labelled boxes on a copy of ``image``."""
+    import cv2
+
+    annotated = image.copy()
+    line = max(round(sum(image.shape[:2]) / 2 * 0.003), 2)
+    for (x1, y1, x2, y2), score, class_id in zip(detections.boxes, detections.scores, detections.class_ids):
+        color = _color(int(class_id))
+        p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+        cv2.rectangle(annotated, p1, p2, color, line, cv2.LINE_AA)
+        label = f"{names.get(int(class_id), int(class_id))} {score:.2f}"
+        font_scale = line / 3
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, max(line - 1, 1))
+        outside = p1[1] - th - 3 >= 0
+        corner = (p1[0] + tw, p1[1] - th - 3 if outside else p1[1] + th + 3)
+        cv2.rectangle(annotated, p1, corner, color, -1, cv2.LINE_AA)
+        cv2.putText(
+            annotated, label, (p1[0], p1[1] - 2 if outside else p1[1] + th + 2),
+            cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), max(line - 1, 1), cv2.LINE_AA
+        )
+    return annotated
+
+
+def _color(index):
+    palette = ((56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+               (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0))
+    return palette[index % len(palette)]
+
+
+def create_backend(name, path, **kwargs):
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend {name!r}; choose from {sorted(BACKENDS)}")
+    return backend_class(path, **kwargs)
+
+
+def default_weights(name, pt_path, quantized=False):
+    """Weights file a backend uses when none is configured explicitly."""
+    if issubclass(BACKENDS.get(name, InferenceBackend), YoloOnnxBackend):
+        suffix = '.int8.onnx' if quantized else '.onnx'
+        return os.path.splitext(pt_path)[0] + suffix
+    return pt_path
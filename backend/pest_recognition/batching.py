@@ -0,0 +1,119 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ('item', 'future', 'enqueued_at')
+
+    def __init__(self, item):
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for a single worker thread.
+
+    The first request to arrive opens a window of ``max_wait`` seconds; the
+    batch is flushed when the window closes or ``max_batch_size`` items are
+    queued, whichever happens first. ``run_batch`` receives a list of items
+    and must return one result per item, in order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait=0.01, name='micro-batcher'):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def submit(self, item):
+        """Queue ``item`` and return a Future for its result."""
+        pending = _Pending(item)
+        self._ensure_worker()
+        self._queue.put(pending)
+        return pending.future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            self._record(batch, started)
+            try:
+                results = self.run_batch([pending.item for pending in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"Batch returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as exc:
+                logger.exception("%s: batch of %d failed", self.name, len(batch))
+                for pending in batch:
+                    pending.future.set_exception(exc)
+                continue
+            for pending, result in zip(batch, results):
+                pending.future.set_result(result)
+
+    def _record(self, batch, started):
+        delays = [started - pending.enqueued_at for pending in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._queue_delay_total += sum(delays)
+            self._queue_delay_max = max(self._queue_delay_max, max(delays))
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._batches = 0
+            self._items = 0
+            self._queue_delay_total = 0.0
+            self._queue_delay_max = 0.0
+
+    def stats(self):
+        with self._stats_lock:
+            batches, items = self._batches, self._items
+            delay_total, delay_max = self._queue_delay_total, self._queue_delay_max
+        return {
+            'batches': batches,
+            'requests': items,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'mean_batch_size': items / batches if batches else 0.0,
+            'fill_rate': items / (batches * self.max_batch_size) if batches else 0.0,
+            'mean_queue_delay_ms': delay_total / items * 1000 if items else 0.0,
+            'max_queue_delay_ms': delay_max * 1000,
+            'queued': self._queue.qsize(),
+        }
@@ -0,0 +1,143 @@
+"""
+Latency, memory and agreement measurements for detection backends.
+
+Used by the ``compare_disease_backends`` and ``quantize_disease_model``
+management commands. The first backend in a comparison is the reference that
+the others are scored against.
+"""
+import glob
+import os
+import statistics
+import time
+
+import numpy as np
+
+from .backends import create_backend
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def box_iou(a, b):
+    """Pairwise IoU between N x 4 and M x 4 boxes."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_count(reference, candidate, iou_threshold=0.5):
+    """Greedy one-to-one matches with the same class and IoU >= threshold."""
+    if not len(reference) or not len(candidate):
+        return 0
+    iou = box_iou(reference.boxes, candidate.boxes)
+    iou[reference.class_ids[:, None] != candidate.class_ids[None, :]] = 0
+    matched = 0
+    while True:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] < iou_threshold:
+            return matched
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+
+
+def load_images(directory):
+    import cv2
+
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(directory, pattern)))
+    images = [(os.path.basename(p), cv2.imread(p)) for p in paths]
+    return [(name, img) for name, img in images if img is not None]
+
+
+def _rss_mb():
+    import psutil
+
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def measure(name, path, images, conf, repeat=3):
+    """Load one backend and time it on ``images``; returns (summary, detections)."""
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    backend = create_backend(name, path, conf=conf).load()
+    load_ms = (time.perf_counter() - started) * 1000
+    rss_loaded = peak_rss = _rss_mb()
+
+    latencies = []
+    outputs = []
+    for img in images:
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            detections = backend.predict([img])[0]
+            timings.append((time.perf_counter() - started) * 1000)
+        peak_rss = max(peak_rss, _rss_mb())
+        latencies.append(statistics.median(timings))
+        outputs.append(detections)
+
+    summary = {
+        'backend': name,
+        'weights': path,
+        'weights_mb': os.path.getsize(path) / 1e6,
+        'load_ms': load_ms,
+        'load_memory_mb': rss_loaded - rss_before,
+        'peak_rss_mb': peak_rss,
+        'median_ms': statistics.median(latencies),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'images_per_second': 1000 / statistics.mean(latencies),
+        'detections': sum(len(d) for d in outputs),
+    }
+    return summary, outputs
+
+
+def agreement(reference, candidate):
+    matched = sum(match_count(r, c) for r, c in zip(reference, candidate))
+    ref_total = sum(len(d) for d in reference)
+    cand_total = sum(len(d) for d in candidate)
+    same_classes = sum(
+        set(r.class_ids.tolist()) == set(c.class_ids.tolist())
+        for r, c in zip(reference, candidate)
+    )
+    return {
+        'recall': matched / ref_total if ref_total else 1.0,
+        'precision': matched / cand_total if cand_total else 1.0,
+        'same_class_set': same_classes / len(reference) if reference else 1.0,
+    }
+
+
+def compare(specs, images, conf, repeat=3):
+    """Measure each (backend, weights) pair in ``specs`` against the first one."""
+    images = [img for _, img in images]
+    report = {}
+    reference = None
+    for name, path in specs:
+        label = f"{name}:{os.path.basename(path)}"
+        summary, outputs = measure(name, path, images, conf, repeat)
+        if reference is None:
+            reference = (label, outputs)
+        else:
+            summary['agreement'] = dict(agreement(reference[1], outputs), reference=reference[0])
+        report[label] = summary
+    return report
+
+
+def format_report(report):
+    lines = []
+    for label, r in report.items():
+        line = (
+            f"{label:<28} load {r['load_ms']:>8.1f}ms  +{r['load_memory_mb']:>6.1f} MB  "
+            f"median {r['median_ms']:>7.1f}ms  p95 {r['p95_ms']:>7.1f}ms  "
+            f"{r['images_per_second']:>6.1f} img/s  {r['weights_mb']:>6.1f} MB file  {r['detections']} boxes"
+        )
+        if 'agreement' in r:
+            a = r['agreement']
+            line += (
+                f"\n{'':<28} vs {a['reference']}: recall {a['recall']:.3f} "
+                f"precision {a['precision']:.3f} same classes {a['same_class_set']:.3f}"
+            )
+        lines.append(line)
+    return lines
@@ -1,26 +1,234 @@
-from ultralytics import YOLO
 import numpy as np
+import hashlib
+import logging
 import os
+import threading
 from django.conf import settings
 
+from farm_help_project.metrics import record_model_load, register_gauges, span
+
+from .backends import Detections, UltralyticsBackend, create_backend, default_weights, nms
+from .batching import MicroBatcher
+from .preprocessing import downscale, tile_origins
+
+logger = logging.getLogger(__name__)
+
 MODEL_PATH = os.path.join(settings.BASE_DIR, 'ml_models', 'best.pt')
+CONFIDENCE = 0.4
+
+# Engine that runs the detector; see pest_recognition.backends.BACKENDS
+BACKEND = getattr(settings, 'PLANT_DISEASE_BACKEND', UltralyticsBackend.name)
+QUANTIZED = getattr(settings, 'PLANT_DISEASE_QUANTIZED', False)
+WEIGHTS_PATH = (
+    getattr(settings, 'PLANT_DISEASE_WEIGHTS', None)
+    or default_weights(BACKEND, MODEL_PATH, quantized=QUANTIZED)
+)
+
+# Longest image side fed to the model, rendered and encoded; larger uploads
+# are shrunk first
+MAX_IMAGE_SIDE = getattr(settings, 'PLANT_DISEASE_MAX_IMAGE_SIDE', 1280)
+# Tiled mode: photos whose longer side exceeds TILE_MIN_SIDE are cut into
+# overlapping TILE_SIZE tiles (after capping them at TILED_MAX_SIDE)
+TILED = getattr(settings, 'PLANT_DISEASE_TILED', False)
+TILE_SIZE = getattr(settings, 'PLANT_DISEASE_TILE_SIZE', 640)
+TILE_OVERLAP = getattr(settings, 'PLANT_DISEASE_TILE_OVERLAP', 0.2)
+TILE_MIN_SIDE = getattr(settings, 'PLANT_DISEASE_TILE_MIN_SIDE', 2000)
+TILED_MAX_SIDE = getattr(settings, 'PLANT_DISEASE_TILED_MAX_SIDE', 4096)
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded detection backends, keyed by (backend, weights path).
+
+    Each model is loaded and warmed up exactly once per process. Calls to
+    ``predict`` are serialized per model because neither the ultralytics
+    predictor nor a cv2.dnn network is safe to share between threads.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._predict_locks = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def get(self, backend=BACKEND, path=WEIGHTS_PATH):
+        key = (backend, path)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(backend, path)
+                self._predict_locks[key] = threading.Lock()
+                self._models[key] = model
+        return model
+
+    def _load(self, backend, path):
+        key = (backend, path)
+        if not os.path.exists(path):
+            error = FileNotFoundError(f"Model file not found at {path}")
+            self._errors[key] = str(error)
+            record_model_load(backend, 'error')
+            raise error
+        try:
+            # load() also runs the first forward pass, which builds the graph
+            # and allocates buffers; pay it here instead of on the first upload.
+            with span('model_load'):
+                model = create_backend(backend, path, conf=CONFIDENCE).load()
+        except Exception as exc:
+            self._errors[key] = str(exc)
+            record_model_load(backend, 'error')
+            raise
+        self._errors.pop(key, None)
+        record_model_load(backend, 'loaded')
+        logger.info("Loaded %s detection model from %s", backend, path)
+        return model
+
+    def predict(self, images, backend=BACKEND, path=WEIGHTS_PATH):
+        model = self.get(backend, path)
+        with self._predict_locks[(backend, path)]:
+            return model.predict(images)
+
+    def is_ready(self, backend=BACKEND, path=WEIGHTS_PATH):
+        return (backend, path) in self._models
+
+    def last_error(self, backend=BACKEND, path=WEIGHTS_PATH):
+        return self._errors.get((backend, path))
+
+    def preload(self, backend=BACKEND, path=WEIGHTS_PATH, background=True):
+        """Load and warm up a model, optionally on a daemon thread."""
+        def _run():
+            try:
+                self.get(backend, path)
+            except Exception:
+                logger.exception("Failed to preload %s detection model from %s", backend, path)
+
+        if not background:
+            _run()
+            return None
+        thread = threading.Thread(target=_run, name='model-preload', daemon=True)
+        thread.start()
+        return thread
+
+
+registry = ModelRegistry()
+
+_versions = {}
+
+
+def model_version(path=WEIGHTS_PATH):
+    """Short content hash of the weights file, used to key stored results."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    version = _versions.get(key)
+    if version is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        version = _versions[key] = digest.hexdigest()[:16]
+    return version
+
+
+def class_names():
+    """The model's class id -> name table, stable across images."""
+    return dict(registry.get().names)
+
+
+def predict_batch(images):
+    """Run one batched forward pass and return a ``Detections`` per image."""
+    return registry.predict(list(images))
+
+
+batcher = MicroBatcher(
+    predict_batch,
+    max_batch_size=getattr(settings, 'PLANT_DISEASE_BATCH_MAX_SIZE', 8),
+    max_wait=getattr(settings, 'PLANT_DISEASE_BATCH_MAX_WAIT_MS', 10) / 1000,
+    name='disease-batcher'
+)
+register_gauges('disease_batcher', batcher.stats)
+register_gauges('disease_model', lambda: {'ready': int(registry.is_ready())})
+
+
+def predict_tiled(image):
+    """Detect on overlapping tiles and merge boxes back into image coordinates."""
+    with span('preprocess'):
+        image, scale = downscale(image, TILED_MAX_SIDE)
+        origins = tile_origins(image.shape, TILE_SIZE, TILE_OVERLAP)
+        tiles = [np.ascontiguousarray(image[y:y + TILE_SIZE, x:x + TILE_SIZE]) for x, y in origins]
+    model = registry.get()
+
+    with span('model'):
+        per_tile = registry.predict(tiles)
+    boxes = np.concatenate([
+        d.boxes + np.array([x, y, x, y], dtype=np.float32) for (x, y), d in zip(origins, per_tile)
+    ])
+    scores = np.concatenate([d.scores for d in per_tile])
+    class_ids = np.concatenate([d.class_ids for d in per_tile])
+    if not len(class_ids):
+        return Detections.empty()
+    # Lesions on tile borders are seen by neighbouring tiles too
+    with span('nms'):
+        keep = nms(boxes, scores, class_ids, model.iou)
+    return Detections(boxes[keep], scores[keep], class_ids[keep]).scaled(1 / scale)
+
+
+def detect(image):
+    """Return ``Detections`` in ``image``'s own pixel coordinates and the class names."""
+    model = registry.get()
+    if TILED and max(image.shape[:2]) > TILE_MIN_SIDE:
+        return predict_tiled(image), model.names
+
+    with span('preprocess'):
+        small, scale = downscale(image, MAX_IMAGE_SIDE)
+    # With batching this includes the wait for the batch to fill
+    with span('model'):
+        if getattr(settings, 'PLANT_DISEASE_BATCHING', False):
+            detections = batcher(small)
+        else:
+            detections = predict_batch([small])[0]
+    return detections.scaled(1 / scale), model.names
+
+
+def detect_batch(images):
+    """``detect`` for several images with a single forward pass.
+
+    Images large enough for tiled mode are still run on their own.
+    """
+    model = registry.get()
+    results = [None] * len(images)
+    pending, small, scales = [], [], []
+    for i, image in enumerate(images):
+        if TILED and max(image.shape[:2]) > TILE_MIN_SIDE:
+            results[i] = predict_tiled(image)
+            continue
+        with span('preprocess'):
+            resized, scale = downscale(image, MAX_IMAGE_SIDE)
+        pending.append(i)
+        small.append(resized)
+        scales.append(scale)
+    if small:
+        with span('model'):
+            batch = predict_batch(small)
+        for i, detections, scale in zip(pending, batch, scales):
+            results[i] = detections.scaled(1 / scale)
+    return results, model.names
+
+
+def render(image, detections):
+    """Draw ``detections`` on a copy of ``image`` no larger than MAX_IMAGE_SIDE."""
+    preview, scale = downscale(image, MAX_IMAGE_SIDE)
+    return registry.get().render(preview, detections.scaled(scale))
+
+
+def decode_max_side():
+    """Resolution uploads need to be decoded at for the configured mode."""
+    return TILED_MAX_SIDE if TILED else MAX_IMAGE_SIDE
+
 
 def inference(image):
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-
-    # Load model and get class mapper
-    model = YOLO(MODEL_PATH)
-    class_mapper = model.names
-
-    results = model(image, conf=0.4)
-    
-    infer = np.zeros(image.shape, dtype=np.uint8)
-    detected_classes = []  # Detected class names
-    
-    for r in results:
-        infer = r.plot()
-        # Get class names using the mapper
-        detected_classes = [class_mapper[int(idx)] for idx in r.boxes.cls.tolist()]
-    
+    detections, class_mapper = detect(image)
+    infer = render(image, detections)
+    # Get class names using the mapper
+    detected_classes = [class_mapper[int(idx)] for idx in detections.class_ids]
     return infer, class_mapper, detected_classes
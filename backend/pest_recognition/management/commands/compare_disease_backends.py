@@ -0,0 +1,43 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pest_recognition.backends import BACKENDS, default_weights
+from pest_recognition.evaluation import compare, format_report, load_images
+from pest_recognition.inference import CONFIDENCE, MODEL_PATH
+
+
+class Command(BaseCommand):
+    help = "Compare detection agreement, latency and memory of inference backends on sample images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', default=os.path.join(settings.MEDIA_ROOT, 'plant_disease_images'))
+        parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS),
+                            help="The first backend is the reference for agreement.")
+        parser.add_argument('--weights', nargs='*', default=[],
+                            help="Weights per backend, in the same order (default: ml_models/best.*).")
+        parser.add_argument('--conf', type=float, default=CONFIDENCE)
+        parser.add_argument('--repeat', type=int, default=3, help="Timed passes per image.")
+        parser.add_argument('--output', help="Write the report as JSON to this file.")
+
+    def handle(self, *args, **options):
+        images = load_images(options['images'])
+        if not images:
+            raise CommandError(f"No images found in {options['images']}")
+        names = options['backends']
+        weights = options['weights'] + [default_weights(n, MODEL_PATH) for n in names[len(options['weights']):]]
+
+        try:
+            report = compare(list(zip(names, weights)), images, options['conf'], options['repeat'])
+        except (OSError, ImportError) as exc:
+            raise CommandError(f"Could not load backend: {exc}")
+
+        self.stdout.write(f"{len(images)} images from {options['images']}")
+        for line in format_report(report):
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'images': len(images), 'backends': report}, f, indent=2)
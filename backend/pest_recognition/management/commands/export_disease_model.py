@@ -0,0 +1,39 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pest_recognition.backends import metadata_path
+from pest_recognition.inference import MODEL_PATH, model_version
+
+
+class Command(BaseCommand):
+    help = "Export best.pt to ONNX for the 'opencv' inference backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weights', default=MODEL_PATH, help="PyTorch weights to export.")
+        parser.add_argument('--imgsz', type=int, default=640)
+        parser.add_argument('--opset', type=int, default=12)
+
+    def handle(self, *args, **options):
+        weights = options['weights']
+        if not os.path.exists(weights):
+            raise CommandError(f"Model file not found at {weights}")
+
+        from ultralytics import YOLO
+
+        model = YOLO(weights)
+        # Written next to the weights, which is where the opencv backend looks
+        output = model.export(
+            format='onnx', imgsz=options['imgsz'], opset=options['opset'],
+            dynamic=False, simplify=True, verbose=False
+        )
+
+        with open(metadata_path(output), 'w') as f:
+            json.dump({
+                'names': {str(k): v for k, v in model.names.items()},
+                'imgsz': options['imgsz'],
+                'source': os.path.basename(weights),
+                'source_version': model_version(weights),
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output} and {metadata_path(output)}"))
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pest_recognition.backends import OnnxRuntimeBackend, default_weights, letterbox, metadata_path
+from pest_recognition.evaluation import compare, format_report, load_images
+from pest_recognition.inference import CONFIDENCE, MODEL_PATH
+
+
+class CalibrationReader:
+    """Feeds letterboxed calibration images to onnxruntime's static quantizer."""
+
+    def __init__(self, images, input_name, imgsz):
+        self.images = images
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.rewind()
+
+    @staticmethod
+    def _blob(img, imgsz):
+        import cv2
+
+        padded, _, _ = letterbox(img, imgsz)
+        return cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)
+
+    def get_next(self):
+        blob = next(self._blobs, None)
+        return None if blob is None else {self.input_name: blob}
+
+    def rewind(self):
+        self._blobs = (self._blob(img, self.imgsz) for _, img in self.images)
+
+
+class Command(BaseCommand):
+    help = (
+        "Quantize the exported ONNX disease model to INT8 for the 'onnxruntime' backend "
+        "and report latency, memory and agreement against the float model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=default_weights(OnnxRuntimeBackend.name, MODEL_PATH),
+                            help="Float ONNX model from `manage.py export_disease_model`.")
+        parser.add_argument('--mode', choices=['static', 'dynamic'], default='static',
+                            help="static calibrates activations on --calibration images.")
+        parser.add_argument('--calibration', default=os.path.join(settings.MEDIA_ROOT, 'plant_disease_images'),
+                            help="Folder of representative leaf images.")
+        parser.add_argument('--max-calibration-images', type=int, default=200)
+        parser.add_argument('--conf', type=float, default=CONFIDENCE)
+        parser.add_argument('--no-report', action='store_true', help="Skip the float vs INT8 comparison.")
+        parser.add_argument('--report-output', help="Write the comparison as JSON to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            import onnxruntime
+            from onnxruntime import quantization
+        except ImportError:
+            raise CommandError("Quantization needs the onnxruntime package installed")
+
+        source = options['source']
+        if not os.path.exists(source) or not os.path.exists(metadata_path(source)):
+            raise CommandError(f"{source} (and its .json sidecar) not found; run `manage.py export_disease_model`")
+        output = os.path.splitext(source)[0] + '.int8.onnx'
+        with open(metadata_path(source)) as f:
+            metadata = json.load(f)
+
+        images = load_images(options['calibration'])
+        if options['mode'] == 'static' and not images:
+            raise CommandError(f"No calibration images found in {options['calibration']}")
+
+        with tempfile.TemporaryDirectory() as scratch:
+            prepared = os.path.join(scratch, 'prepared.onnx')
+            quantization.quant_pre_process(source, prepared, skip_symbolic_shape=True)
+
+            if options['mode'] == 'dynamic':
+                quantization.quantize_dynamic(prepared, output, weight_type=quantization.QuantType.QUInt8)
+            else:
+                input_name = onnxruntime.InferenceSession(
+                    prepared, providers=['CPUExecutionProvider']
+                ).get_inputs()[0].name
+                reader = CalibrationReader(
+                    images[:options['max_calibration_images']], input_name, int(metadata.get('imgsz', 640))
+                )
+                quantization.quantize_static(
+                    prepared, output, reader,
+                    quant_format=quantization.QuantFormat.QDQ,
+                    activation_type=quantization.QuantType.QUInt8,
+                    weight_type=quantization.QuantType.QInt8,
+                    per_channel=True,
+                )
+
+        metadata.update(quantization=options['mode'], float_source=os.path.basename(source))
+        with open(metadata_path(output), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output} ({options['mode']} INT8)"))
+
+        if options['no_report']:
+            return
+        if not images:
+            raise CommandError(f"No images found in {options['calibration']} for the report")
+        report = compare(
+            [(OnnxRuntimeBackend.name, source), (OnnxRuntimeBackend.name, output)],
+            images, options['conf']
+        )
+        for line in format_report(report):
+            self.stdout.write(line)
+        if options['report_output']:
+            with open(options['report_output'], 'w') as f:
+                json.dump({'images': len(images), 'backends': report}, f, indent=2)
@@ -0,0 +1,87 @@
+"""
+Resolution handling for uploaded photos.
+
+Phone cameras produce images far larger than the detector's input size.
+Normally the image is shrunk as early as possible: JPEGs are decoded directly
+at 1/2, 1/4 or 1/8 scale, and anything still larger than ``max_side`` is
+resized before inference, rendering and encoding. For very large photos with
+small lesions, tiled mode instead keeps (most of) the resolution and runs the
+model on overlapping tiles.
+"""
+import io
+
+import numpy as np
+
+REDUCED_DECODE_FACTORS = (8, 4, 2)
+
+
+def image_size(data):
+    """(width, height) read from the image header, or None if unknown."""
+    try:
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def decode(data, max_side=None):
+    """Decode image bytes, using reduced-scale JPEG decoding when the image is
+    at least twice ``max_side`` on its longer side."""
+    import cv2
+
+    flag = cv2.IMREAD_COLOR
+    size = image_size(data) if max_side else None
+    if size:
+        reduced_flags = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+        for factor in REDUCED_DECODE_FACTORS:
+            if max(size) / factor >= max_side:
+                flag = reduced_flags[factor]
+                break
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if img is None:
+        raise ValueError("Could not decode image.")
+    return img
+
+
+def downscale(image, max_side):
+    """Shrink ``image`` so its longer side is at most ``max_side``; returns (image, scale)."""
+    import cv2
+
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return image, 1.0
+    scale = max_side / longest
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _starts(length, tile, stride):
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_origins(shape, tile_size, overlap):
+    """Top-left corners of overlapping ``tile_size`` tiles covering an image."""
+    height, width = shape[:2]
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [(x, y) for y in _starts(height, tile_size, stride) for x in _starts(width, tile_size, stride)]
+
+
+def encode(image, image_format='jpeg', quality=85):
+    """Compress ``image`` as WebP or JPEG; returns (bytes, file extension)."""
+    import cv2
+
+    if image_format == 'webp':
+        extension, params = '.webp', [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        extension, params = '.jpg', [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    success, buffer = cv2.imencode(extension, image, params)
+    if not success:
+        raise ValueError("Could not encode image.")
+    return buffer.tobytes(), extension
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from farm_help_project.metrics import span
+
+# Seconds a resolved user is reused; 0 looks the user up on every request
+USER_CACHE_TTL = getattr(settings, 'JWT_USER_CACHE_TTL', 30)
+USER_CACHE_ALIAS = getattr(settings, 'JWT_USER_CACHE_ALIAS', 'default')
+
+
+def user_cache_key(user_id):
+    return f'users:jwt-user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    caches[USER_CACHE_ALIAS].delete(user_cache_key(user_id))
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """simplejwt's authentication, timed as the request's 'auth' stage, with
+    the user row cached per token subject for JWT_USER_CACHE_TTL seconds.
+
+    Users are cached only after passing simplejwt's own checks, and the
+    is_active and password-revocation checks run again on every cache hit.
+    Saving or deleting a user drops the entry (see users.signals).
+    """
+
+    def authenticate(self, request):
+        with span('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not USER_CACHE_TTL:
+            return super().get_user(validated_token)
+
+        cache = caches[USER_CACHE_ALIAS]
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, USER_CACHE_TTL)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return user
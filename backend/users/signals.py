@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import invalidate_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Covers UserProfileView, the admin and is_active changes made with save();
+    # queryset.update() bypasses signals and is only bounded by the TTL
+    invalidate_cached_user(getattr(instance, api_settings.USER_ID_FIELD))
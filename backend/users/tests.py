@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .models import User
+
+SOIL_SAMPLE = {
+    'nitrogen': 90, 'phosphorus': 42, 'potassium': 43, 'ph': 6.5,
+    'rainfall': 202.9, 'humidity': 82.0, 'temperature': 20.9,
+}
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('farmer', password='password')
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'farmer', 'password': 'password'}, format='json'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_cached_user_skips_the_lookup(self):
+        self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')
+        # Only the prediction insert and its rollup, inside a savepoint (the test
+        # case's transaction turns atomic() into one); the caller is not looked up again
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('predict_crop'), SOIL_SAMPLE, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_profile_update_is_visible_immediately(self):
+        self.client.get(reverse('user_profile'))
+        self.client.patch(reverse('user_profile'), {'farm_location': 'Nashik'}, format='json')
+        response = self.client.get(reverse('user_profile'))
+        self.assertEqual(response.data['farm_location'], 'Nashik')
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('user_profile')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user_profile')).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('user_profile')).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse('user_profile')).status_code, 401)
@@ -35,28 +35,31 @@ const PredictionHistory = () => {
           return;
         }
 
-        const response = await axios.get('http://localhost:8000/api/prediction-history/', {
-          headers: {
-            'Authorization': `Bearer ${token}`
+        // The history is cursor paginated; follow `next` so the table and
+        // charts cover every prediction, not just the newest page
+        let items = [];
+        let url = 'http://localhost:8000/api/prediction-history/?page_size=500';
+        while (url) {
+          const response = await axios.get(url, {
+            headers: {
+              'Authorization': `Bearer ${token}`
+            }
+          });
+          const page = response.data && response.data.results;
+          if (!Array.isArray(page)) {
+            items = null;
+            console.error('Invalid data format:', response.data);
+            break;
           }
-        });
-        
-        if (response.data && Array.isArray(response.data)) {
+          items = items.concat(page);
+          url = response.data.next;
+        }
+
+        if (Array.isArray(items)) {
           // Process the data for charts
-          const processedData = response.data.map(item => {
+          const processedData = items.map(item => {
             try {
-              // Safely parse the soil_params_json string into an object
-              let soilParams = {};
-              
-              if (item.soil_params_json) {
-                try {
-                  soilParams = JSON.parse(item.soil_params_json);
-                } catch (jsonError) {
-                  console.warn('Invalid JSON in soil_params_json:', jsonError);
-                  // Use an empty object if parsing fails
-                  soilParams = {};
-                }
-              }
+              const soilParams = item.soil_params || {};
               
               return {
                 ...item,
@@ -75,7 +78,6 @@ const PredictionHistory = () => {
           setPredictionHistory(processedData);
         } else {
           setError('Invalid data format received from server');
-          console.error('Invalid data format:', response.data);
         }
         
         setLoading(false);